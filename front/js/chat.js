@@ -1,8 +1,12 @@
+// TTS 오디오 포맷(서버 audio_format) → 재생용 MIME
+const TTS_MIME_TYPES = { mp3: 'audio/mpeg', wav: 'audio/wav', opus: 'audio/ogg', aac: 'audio/aac', flac: 'audio/flac' };
+
 // Live2D 모델 관리 클래스
 class Live2DManager {
     constructor() {
         this.model = null;
         this.app = null;
+        this.currentAudio = null;
         this.canvas = document.getElementById('live2d-canvas');
         window.PIXI = PIXI;
         console.log('Live2DManager initialized');
@@ -50,7 +54,7 @@ class Live2DManager {
         }
     }
 
-    async playAudioWithLipSync(audioBase64) {
+    async playAudioWithLipSync(audioBase64, lipsync = null, audioFormat = 'mp3') {
         if (!this.model) {
             console.warn('Live2D model not initialized');
             return;
@@ -65,12 +69,13 @@ class Live2DManager {
                 uint8Array[i] = audioData.charCodeAt(i);
             }
 
-            let mimeType = 'audio/webm;codecs=opus';
-            if (!MediaRecorder.isTypeSupported(mimeType)) {
-                alert('이 브라우저는 webm 녹음을 지원하지 않습니다. 최신 Chrome을 사용해 주세요.');
+            // 서버가 계산한 입모양 엔벨로프가 있으면 재생 위치로 인덱싱만 (프레임별 분석 없음)
+            if (lipsync && lipsync.env) {
+                await this._playWithEnvelope(arrayBuffer, lipsync, audioFormat);
                 return;
             }
-            const audioBlob = new Blob([arrayBuffer], { type: mimeType });
+
+            const audioBlob = new Blob([arrayBuffer], { type: TTS_MIME_TYPES[audioFormat] || 'audio/mpeg' });
             const audioUrl = URL.createObjectURL(audioBlob);
             console.log('Audio blob created and URL generated');
 
@@ -92,9 +97,43 @@ class Live2DManager {
         }
     }
 
+    async _playWithEnvelope(arrayBuffer, lipsync, audioFormat) {
+        const audioUrl = URL.createObjectURL(new Blob([arrayBuffer], { type: TTS_MIME_TYPES[audioFormat] || 'audio/mpeg' }));
+        const env = Uint8Array.from(atob(lipsync.env), c => c.charCodeAt(0));
+        const fps = lipsync.fps;
+        const internalModel = this.model.internalModel;
+        const audio = new Audio(audioUrl);
+        this.currentAudio = audio;
+
+        // 모델 업데이트 직전마다 현재 재생 위치의 값 적용 (모션이 덮어쓰지 않도록)
+        const applyMouth = () => {
+            const i = Math.floor(audio.currentTime * fps);
+            const value = i < env.length && !audio.paused ? env[i] / 255 : 0;
+            internalModel.coreModel.setParameterValueById('ParamMouthOpenY', value);
+        };
+        internalModel.on('beforeModelUpdate', applyMouth);
+        try {
+            await new Promise((resolve) => {
+                audio.onended = resolve;
+                audio.onerror = resolve;
+                audio.onpause = resolve;
+                audio.play().catch(resolve);
+            });
+        } finally {
+            internalModel.off('beforeModelUpdate', applyMouth);
+            internalModel.coreModel.setParameterValueById('ParamMouthOpenY', 0);
+            URL.revokeObjectURL(audioUrl);
+            this.currentAudio = null;
+            console.log('Audio playback completed, URL revoked');
+        }
+    }
+
     stopSpeaking() {
         if (this.model) {
             console.log('Stopping speech and resetting expression');
+            if (this.currentAudio) {
+                this.currentAudio.pause();
+            }
             this.model.stopSpeaking();
             this.setExpression('neutral');
         }
@@ -325,6 +364,20 @@ class ChatManager {
         }
     }
 
+    // 녹음 시작 시 서버 프리웜 (업스트림 연결/세션 상태 미리 준비, 응답은 기다리지 않음)
+    prewarm() {
+        const apiKey = localStorage.getItem('openai_api_key');
+        if (!apiKey) return;
+        const formData = new FormData();
+        formData.append('character', this.characterType);
+        fetch('/scripts/prewarm', {
+            method: 'POST',
+            body: formData,
+            headers: { 'X-API-KEY': apiKey },
+            keepalive: true
+        }).catch(err => console.warn('prewarm failed:', err));
+    }
+
     // 대화 기록 가져오기
     getConversationHistory() {
         return this.conversationHistory;
@@ -380,6 +433,7 @@ async function handleRecording() {
 
     if (!audioManager.isRecording) {
         console.log('Starting new recording');
+        chatManager.prewarm();
         const started = await audioManager.startRecording();
         if (started) {
             recordButton.textContent = '멈추기';
@@ -406,13 +460,15 @@ async function handleRecording() {
                 response = await chatManager.sendAudioToServer(audioBlob);
             }
 
-            if (response.user_text) {
+            if (response.user_text && !response.rendered) {
                 chatManager.addMessage('user', response.user_text);
             }
 
             if (response.ai_text) {
-                // 4번째 인자로 전체 payload 전달 → 카드까지 렌더
-                chatManager.addMessage('ai', response.ai_text, null, response);
+                // 4번째 인자로 전체 payload 전달 → 카드까지 렌더 (스트리밍 meta 로 이미 렌더했으면 생략)
+                if (!response.rendered) {
+                    chatManager.addMessage('ai', response.ai_text, null, response);
+                }
 
                 if (response.audio) {
                     console.log('Starting audio playback');
@@ -420,7 +476,7 @@ async function handleRecording() {
                     live2dManager.setExpression('speaking');
 
                     try {
-                        await live2dManager.playAudioWithLipSync(response.audio);
+                        await live2dManager.playAudioWithLipSync(response.audio, response.lipsync, response.audio_format);
                         console.log('Audio playback completed');
                     } catch (error) {
                         console.error('Playback error:', error);
@@ -448,6 +504,7 @@ async function sendAudioToServerStream(audioBlob, characterType = 'kei') {
   const formData = new FormData();
   formData.append('audio', audioBlob, 'audio.webm');
   formData.append('character', characterType);
+  formData.append('framing', 'compact');  // 토큰 묶음 + 원문 텍스트 프레임
 
   const resp = await fetch('/scripts/chat_stream', {
     method: 'POST',
@@ -467,6 +524,7 @@ async function sendAudioToServerStream(audioBlob, characterType = 'kei') {
   // 최초 토큰 수신 시 AI 말풍선 뼈대
   let hasSkeleton = false;
   let skeletonEl = null;
+  let rendered = false;  // meta 수신으로 말풍선 렌더 완료 여부
 
   while (true) {
     const { value, done } = await reader.read();
@@ -475,18 +533,19 @@ async function sendAudioToServerStream(audioBlob, characterType = 'kei') {
 
     let idx;
     while ((idx = buffer.indexOf('\n\n')) >= 0) {
-      const chunk = buffer.slice(0, idx).trim();
+      const chunk = buffer.slice(0, idx);
       buffer = buffer.slice(idx + 2);
 
-      // SSE 포맷: "event: token" + "data: {...}"
+      // SSE 포맷: "event: t|token|meta|final" + "data: ..." (여러 줄이면 \n 으로 이어 붙임)
       const lines = chunk.split('\n');
       const ev = (lines.find(l => l.startsWith('event:')) || '').slice(6).trim();
-      const dataLine = (lines.find(l => l.startsWith('data:')) || '').slice(5).trim();
+      const dataLine = lines.filter(l => l.startsWith('data:')).map(l => l.slice(5).replace(/^ /, '')).join('\n');
 
       if (!ev || !dataLine) continue;
 
-      if (ev === 'token') {
-        const { token } = JSON.parse(dataLine);
+      if (ev === 't' || ev === 'token') {
+        // t: 묶음 원문 텍스트 / token: (호환) 델타별 JSON
+        const token = ev === 't' ? dataLine : JSON.parse(dataLine).token;
         if (!hasSkeleton) {
           chatManager.addMessage('ai', '', null, null);
           skeletonEl = chatManager.chatHistory.lastElementChild.querySelector('.message-content');
@@ -497,6 +556,23 @@ async function sendAudioToServerStream(audioBlob, characterType = 'kei') {
           skeletonEl.innerHTML = safe;
           chatManager.chatHistory.scrollTop = chatManager.chatHistory.scrollHeight;
         }
+      } else if (ev === 'meta') {
+        // 텍스트/카드 먼저 도착 (오디오는 final 에서)
+        const meta = JSON.parse(dataLine);
+        if (meta.user_text) {
+          chatManager.addMessage('user', meta.user_text);
+          // 토큰 말풍선이 먼저 생겼다면 사용자 말풍선 뒤로 이동
+          if (skeletonEl) chatManager.chatHistory.appendChild(skeletonEl.closest('.message'));
+        }
+        if (skeletonEl) {
+          skeletonEl.innerHTML = _sanitizeHtml(meta.ai_text);
+          const cardHTML = _renderSuggestion(meta.proactive_card);
+          if (cardHTML) skeletonEl.insertAdjacentHTML('beforeend', cardHTML);
+        } else {
+          chatManager.addMessage('ai', meta.ai_text, null, meta);
+        }
+        chatManager.chatHistory.scrollTop = chatManager.chatHistory.scrollHeight;
+        rendered = true;
       } else if (ev === 'final') {
         finalPayload = JSON.parse(dataLine);
       }
@@ -504,6 +580,7 @@ async function sendAudioToServerStream(audioBlob, characterType = 'kei') {
   }
 
   if (!finalPayload) throw new Error('no final payload from stream');
+  finalPayload.rendered = rendered;
   return finalPayload;
 }
 
@@ -514,7 +591,7 @@ function _esc(s){return (s||"").replace(/[&<>'"]/g,c=>({'&':'&amp;','<':'&lt;','
 function _renderSuggestion(card){
   if(!card) return "";
   const alt = (card.alt||[]).map(x=>`<a href="${x.url}" target="_blank" rel="noopener">${_esc(x.title)}</a>`).join(" · ");
-  const type = _esc(card.type || 'info');
+  const type = _esc(card.type_key || card.card_type || 'info');
   return `
     <div class="suggestion-card">
       <div class="suggestion-title">${_esc(card.title || "Suggestion")}</div>
@@ -1,8 +1,12 @@
+// TTS 오디오 포맷(서버 audio_format) → 재생용 MIME
+const TTS_MIME_TYPES = { mp3: 'audio/mpeg', wav: 'audio/wav', opus: 'audio/ogg', aac: 'audio/aac', flac: 'audio/flac' };
+
 // Live2D 모델 관리 클래스
 class Live2DManager {
     constructor() {
         this.model = null;        // Live2D 모델 객체를 저장할 변수
         this.app = null;          // PIXI 애플리케이션 객체를 저장할 변수
+        this.currentAudio = null; // 엔벨로프 립싱크로 재생 중인 Audio 객체
         this.canvas = document.getElementById('live2d-canvas');  // HTML에서 Live2D 캔버스 요소를 가져옴
         window.PIXI = PIXI;       // PIXI 객체를 전역 변수로 설정
         console.log('Live2DManager initialized');  // Live2DManager가 초기화되었음을 콘솔에 출력
@@ -52,7 +56,7 @@ class Live2DManager {
         }
     }
 
-    async playAudioWithLipSync(audioBase64) {
+    async playAudioWithLipSync(audioBase64, lipsync = null, audioFormat = 'mp3') {
         if (!this.model) {  // 모델이 로드되지 않았으면 함수 종료
             console.warn('Live2D model not initialized');  // 모델 초기화 안됨 경고
             return;
@@ -69,7 +73,13 @@ class Live2DManager {
                 uint8Array[i] = audioData.charCodeAt(i);
             }
 
-            const audioBlob = new Blob([arrayBuffer], { type: 'audio/webm;codecs=opus' });  // 오디오 데이터로 Blob 객체 생성
+            // 서버가 계산한 입모양 엔벨로프가 있으면 재생 위치로 인덱싱만 (프레임별 분석 없음)
+            if (lipsync && lipsync.env) {
+                await this._playWithEnvelope(arrayBuffer, lipsync, audioFormat);
+                return;
+            }
+
+            const audioBlob = new Blob([arrayBuffer], { type: TTS_MIME_TYPES[audioFormat] || 'audio/mpeg' });  // TTS 포맷에 맞는 MIME 으로 Blob 객체 생성
             const audioUrl = URL.createObjectURL(audioBlob);  // Blob을 URL로 변환
             console.log('Audio blob created and URL generated');  // Blob 생성 및 URL 생성 완료 메시지
 
@@ -93,9 +103,44 @@ class Live2DManager {
         }
     }
 
+    async _playWithEnvelope(arrayBuffer, lipsync, audioFormat) {
+        const audioUrl = URL.createObjectURL(new Blob([arrayBuffer], { type: TTS_MIME_TYPES[audioFormat] || 'audio/mpeg' }));  // 재생용 URL
+        const env = Uint8Array.from(atob(lipsync.env), c => c.charCodeAt(0));  // 프레임별 입 벌림 정도 (0~255)
+        const fps = lipsync.fps;  // 엔벨로프 프레임 수/초
+        const internalModel = this.model.internalModel;  // 파라미터를 쓸 내부 모델
+        const audio = new Audio(audioUrl);  // 일반 Audio 요소로 재생
+        this.currentAudio = audio;  // 중지할 수 있도록 보관
+
+        // 모델 업데이트 직전마다 현재 재생 위치의 값 적용 (모션이 덮어쓰지 않도록)
+        const applyMouth = () => {
+            const i = Math.floor(audio.currentTime * fps);  // 재생 위치 → 프레임 인덱스
+            const value = i < env.length && !audio.paused ? env[i] / 255 : 0;  // 0~1 로 변환
+            internalModel.coreModel.setParameterValueById('ParamMouthOpenY', value);  // 입 벌림 적용
+        };
+        internalModel.on('beforeModelUpdate', applyMouth);  // 렌더 루프에 연결
+        try {
+            // 재생이 끝나거나(ended) 중지/에러 시까지 대기
+            await new Promise((resolve) => {
+                audio.onended = resolve;
+                audio.onerror = resolve;
+                audio.onpause = resolve;
+                audio.play().catch(resolve);
+            });
+        } finally {
+            internalModel.off('beforeModelUpdate', applyMouth);  // 렌더 루프에서 해제
+            internalModel.coreModel.setParameterValueById('ParamMouthOpenY', 0);  // 입 닫기
+            URL.revokeObjectURL(audioUrl);  // 생성된 URL 해제
+            this.currentAudio = null;
+            console.log('Audio playback completed, URL revoked');  // 오디오 재생 완료 및 URL 해제 메시지
+        }
+    }
+
     stopSpeaking() {
         if (this.model) {  // 모델이 로드되었는지 확인
             console.log('Stopping speech and resetting expression');  // 말하기 중지 및 표정 재설정 메시지
+            if (this.currentAudio) {
+                this.currentAudio.pause();  // 엔벨로프 재생 중이면 중지
+            }
             this.model.stopSpeaking();  // 모델의 말하기 중지
             this.setExpression('neutral');  // 표정을 'neutral'로 재설정
         }
@@ -312,9 +357,11 @@ class ChatManager {
             formData.append('character', this.characterType);  // 캐릭터 정보 추가
 
             console.log('Sending request to server');  // 서버 요청 전송 메시지
+            const apiKey = localStorage.getItem('openai_api_key');  // 저장된 API 키 가져오기
             const response = await fetch('/scripts/chat', {  // 서버 API 호출
                 method: 'POST',  // POST 메서드 사용
-                body: formData  // FormData를 요청 본문으로 설정
+                body: formData,  // FormData를 요청 본문으로 설정
+                headers: { 'X-API-KEY': apiKey || '' }  // 프리웜과 같은 키로 요청
             });
 
             if (!response.ok) {  // 응답이 성공이 아닌 경우
@@ -332,6 +379,20 @@ class ChatManager {
         }
     }
 
+    // 녹음 시작 시 서버 프리웜 (업스트림 연결/세션 상태 미리 준비, 응답은 기다리지 않음)
+    prewarm() {
+        const apiKey = localStorage.getItem('openai_api_key');  // 저장된 API 키 가져오기
+        if (!apiKey) return;  // 키가 없으면 생략
+        const formData = new FormData();  // FormData 객체 생성
+        formData.append('character', this.characterType);  // 캐릭터 정보 추가
+        fetch('/scripts/prewarm', {
+            method: 'POST',
+            body: formData,
+            headers: { 'X-API-KEY': apiKey },
+            keepalive: true  // 페이지 이동 중에도 전송 유지
+        }).catch(err => console.warn('prewarm failed:', err));  // 실패해도 녹음은 계속
+    }
+
     // 대화 기록 가져오기
     getConversationHistory() {
         return this.conversationHistory;  // 대화 기록 배열 반환
@@ -383,6 +444,7 @@ async function handleRecording() {
 
     if (!audioManager.isRecording) {  // 녹음 중이 아닌 경우
         console.log('Starting new recording');  // 새 녹음 시작 메시지
+        chatManager.prewarm();  // 서버 프리웜 (응답 대기 없음)
         const started = await audioManager.startRecording();  // 녹음 시작
         if (started) {  // 녹음 시작 성공한 경우
             recordButton.textContent = '멈추기';  // 버튼 텍스트 변경
@@ -419,7 +481,7 @@ async function handleRecording() {
                     live2dManager.setExpression('speaking');  // 'speaking' 표정 설정
 
                     try {
-                        await live2dManager.playAudioWithLipSync(response.audio);  // 립싱크와 함께 오디오 재생
+                        await live2dManager.playAudioWithLipSync(response.audio, response.lipsync, response.audio_format);  // 서버 엔벨로프로 립싱크하며 오디오 재생
                         console.log('Audio playback completed');  // 오디오 재생 완료 메시지
                     } catch (error) {
                         console.error('Playback error:', error);  // 재생 에러 출력
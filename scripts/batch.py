@@ -0,0 +1,227 @@
+# scripts/batch.py
+"""
+오디오 코퍼스 배치 실행 — HTTP 없이 채팅 파이프라인(STT → 감정 → 답변 → TTS)을 직접 호출
+
+- 입력 : 오디오 디렉터리(하위 폴더 포함) 또는 매니페스트(.jsonl: {"id", "audio", "character", "session_id"})
+- 실행 : asyncio 동시 실행 수 제한(--concurrency) + 분당 업스트림 요청 수 제한(--rpm)
+- 출력 : 항목마다 결과 1줄 NDJSON 을 즉시 append. 출력 파일이 곧 체크포인트라서
+         다시 실행하면 ok 로 끝난 항목은 건너뛰고 실패/미실행 항목만 이어서 돈다.
+- 공유 대화 기록/프로액티브 정책/로그 업로드는 건드리지 않고(카드 생성 안 함) 품질 단계는 --tier 로 고정 (재현성)
+
+사용 예)
+    python -m scripts.batch run recordings/ --out results.ndjson --concurrency 8 --rpm 300
+    python -m scripts.batch run manifest.jsonl --out results.ndjson --save-audio tts_out/
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO
+
+from scripts.config import DEGRADE_TIERS, CHARACTER_SYSTEM_PROMPTS
+from scripts.services import run_offline_turn, set_upstream_rate_limit, metrics
+
+AUDIO_EXTS = (".webm", ".wav", ".mp3", ".m4a", ".ogg", ".flac", ".mp4")
+
+@dataclass
+class BatchItem:
+    id: str
+    audio: str          # 파일 경로
+    character: str
+    session_id: str
+
+# ======================================================================================
+# 입력
+# ======================================================================================
+def iter_items(source: str, character: str) -> Iterator[BatchItem]:
+    """디렉터리(정렬된 파일 순서, 지연 생성) 또는 매니페스트(실행 전 전체 검증)에서 항목 생성"""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTS):
+                    path = os.path.join(root, name)
+                    item_id = os.path.relpath(path, source)
+                    yield BatchItem(item_id, path, character, f"batch-{item_id}")
+        return
+    yield from load_manifest(source, character)
+
+def load_manifest(source: str, character: str) -> List[BatchItem]:
+    """
+    매니페스트 전체를 읽고 검증. 문제가 하나라도 있으면 모든 줄의 오류를 모아 ValueError
+    (실행 도중 워커에서 터져 진행 중 항목이 결과 없이 사라지지 않도록 시작 전에 확인)
+    """
+    base = os.path.dirname(os.path.abspath(source))
+    items: List[BatchItem] = []
+    errors: List[str] = []
+    seen: Set[str] = set()
+    with open(source, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                errors.append(f"{source}:{lineno}: JSON 오류 ({e})")
+                continue
+            if not isinstance(row, dict) or not isinstance(row.get("audio"), str) or not row["audio"]:
+                errors.append(f"{source}:{lineno}: \"audio\" 경로가 필요합니다")
+                continue
+            audio = row["audio"] if os.path.isabs(row["audio"]) else os.path.join(base, row["audio"])
+            item_id = str(row.get("id") or row["audio"])
+            item_character = row.get("character", character)
+            if item_character not in CHARACTER_SYSTEM_PROMPTS:
+                errors.append(f"{source}:{lineno}: 알 수 없는 캐릭터 {item_character}")
+                continue
+            if item_id in seen:  # 체크포인트가 id 기준이므로 중복 금지
+                errors.append(f"{source}:{lineno}: 중복 id {item_id}")
+                continue
+            seen.add(item_id)
+            items.append(BatchItem(item_id, audio, item_character, row.get("session_id") or f"batch-{item_id}"))
+    if errors:
+        raise ValueError("매니페스트 오류:\n" + "\n".join(errors))
+    return items
+
+# ======================================================================================
+# 체크포인트 (출력 NDJSON)
+# ======================================================================================
+def load_done(out_path: str) -> Set[str]:
+    """이미 ok 로 끝난 항목 id (마지막 줄이 중간에 잘렸으면 무시)"""
+    done: Set[str] = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("ok"):
+                done.add(row["id"])
+    return done
+
+def _open_output(out_path: str) -> TextIO:
+    needs_newline = False
+    if os.path.exists(out_path) and os.path.getsize(out_path):
+        with open(out_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(out_path, "a", encoding="utf-8")
+    if needs_newline:  # 중단으로 잘린 마지막 줄과 붙지 않도록
+        out.write("\n")
+    return out
+
+# ======================================================================================
+# 실행
+# ======================================================================================
+class _Batch:
+    def __init__(self, args: argparse.Namespace, out: TextIO):
+        self.args = args
+        self.out = out
+        self.counts = {"ok": 0, "failed": 0}
+
+    def _write(self, row: Dict[str, Any]):
+        self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+    def _save_audio(self, item: BatchItem, payload: Dict[str, Any]) -> Optional[str]:
+        if not self.args.save_audio or not payload.get("audio"):
+            return None
+        path = os.path.join(self.args.save_audio, f"{item.id}.{payload.get('audio_format', 'mp3')}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(payload["audio"]))
+        return path
+
+    async def one(self, item: BatchItem):
+        row: Dict[str, Any] = {"id": item.id, "audio": item.audio, "character": item.character,
+                               "session_id": item.session_id, "tier": self.args.tier}
+        t0 = time.perf_counter()
+        try:
+            audio_bytes = await asyncio.to_thread(_read_bytes, item.audio)
+            payload = await run_offline_turn(self.args.api_key, audio_bytes, item.character,
+                                             item.session_id, self.args.tier,
+                                             filename=os.path.basename(item.audio))
+            audio_file = await asyncio.to_thread(self._save_audio, item, payload)
+            row.update({k: v for k, v in payload.items() if k not in ("audio", "lipsync")})
+            row.update(ok=True, audio_out=audio_file)
+            self.counts["ok"] += 1
+        except Exception as e:
+            row.update(ok=False, error=f"{type(e).__name__}: {e}")
+            self.counts["failed"] += 1
+        row["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+        self._write(row)
+        done = self.counts["ok"] + self.counts["failed"]
+        print(f"[{done}] {item.id} {'ok' if row['ok'] else row['error']} ({row['elapsed_sec']}s)", file=sys.stderr)
+
+    async def run(self, items: Iterator[BatchItem]):
+        """동시 실행 수만큼 워커가 이터레이터에서 하나씩 가져감 (큰 코퍼스도 태스크를 한꺼번에 만들지 않음)"""
+        async def worker():
+            for item in items:
+                await self.one(item)
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m scripts.batch", description="오디오 코퍼스 배치 실행")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run")
+    p_run.add_argument("source", help="오디오 디렉터리 또는 매니페스트(.jsonl)")
+    p_run.add_argument("--out", required=True, help="결과 NDJSON (체크포인트 겸용, append)")
+    p_run.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"))
+    p_run.add_argument("--character", default="kei", choices=sorted(CHARACTER_SYSTEM_PROMPTS))
+    p_run.add_argument("--tier", default="full", choices=[t["name"] for t in DEGRADE_TIERS],
+                       help="고정 품질 단계 (기본 full)")
+    p_run.add_argument("--concurrency", type=int, default=4)
+    p_run.add_argument("--rpm", type=float, default=0, help="분당 업스트림 HTTP 요청 수 제한 (0: 제한 없음)")
+    p_run.add_argument("--limit", type=int, default=0, help="이번 실행에서 처리할 최대 항목 수 (0: 전부)")
+    p_run.add_argument("--save-audio", help="TTS 오디오 저장 디렉터리 (생략 시 저장 안 함)")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("--api-key 또는 OPENAI_API_KEY 가 필요합니다.")
+
+    set_upstream_rate_limit(args.rpm, burst=args.concurrency)
+
+    try:
+        if os.path.isdir(args.source):
+            items = iter_items(args.source, args.character)
+        else:
+            items = iter(load_manifest(args.source, args.character))  # 실행 전에 전체 검증
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    done = load_done(args.out)
+    pending = (it for it in items if it.id not in done)
+    if args.limit:
+        pending = (it for _, it in zip(range(args.limit), pending))
+
+    t0 = time.perf_counter()
+    with _open_output(args.out) as out:
+        batch = _Batch(args, out)
+        asyncio.run(batch.run(pending))
+    wall = time.perf_counter() - t0
+
+    processed = batch.counts["ok"] + batch.counts["failed"]
+    summary = {
+        "skipped": len(done),
+        "ok": batch.counts["ok"],
+        "failed": batch.counts["failed"],
+        "wall_sec": round(wall, 3),
+        "items_per_sec": round(processed / wall, 3) if wall > 0 else None,
+        "upstream": metrics()["upstream"],
+    }
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0 if not batch.counts["failed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,59 @@ CHARACTER_VOICE = {
 
 HISTORY_MAX_LEN = 10
 
+# 같은 오디오(더블클릭/재시도) STT 결과 캐시
+STT_CACHE_TTL_SEC = 120
+STT_CACHE_MAX_ENTRIES = 256
+
+# 업스트림 연결 풀 / 녹음 시작 프리웜
+UPSTREAM_MAX_CLIENTS = 32        # API 키별 클라이언트 최대 보관 수 (LRU)
+UPSTREAM_KEEPALIVE_SEC = 60      # 유휴 연결 유지 시간 (녹음 길이보다 길게)
+PREWARM_SLOT_TTL_SEC = 30        # 프리웜 세션 슬롯 유효 시간
+
+# /scripts/chat_stream SSE 프레이밍
+SSE_FRAMING = "compact"          # token: 델타마다 JSON 이벤트 / compact: 델타 묶음 원문 텍스트
+SSE_FLUSH_MS = 40                # compact: 최대 대기 시간
+SSE_FLUSH_BYTES = 256            # compact: 최대 버퍼 크기
+SSE_COMPRESSION = "auto"         # off | auto(br > gzip) | gzip | br
+
+# 부하 적응형 품질 단계 — 위에서부터 순서대로 악화. 임계치 중 하나라도 넘으면 해당 단계로
+#   in_flight: 진행 중 턴 수 / latency_ms: 업스트림 첫 바이트 지연 EWMA / rate_429: 최근 창 내 429 비율
+DEGRADE_TIERS = [
+    {"name": "full",         "in_flight": 0,  "latency_ms": 0,    "rate_429": 0.0,
+     "search_preview": True,  "emotion_model": "gpt-4o",      "proactive": True},
+    {"name": "no_search",    "in_flight": 8,  "latency_ms": 2500, "rate_429": 0.02,
+     "search_preview": False, "emotion_model": "gpt-4o",      "proactive": True},
+    {"name": "lite_emotion", "in_flight": 16, "latency_ms": 4000, "rate_429": 0.05,
+     "search_preview": False, "emotion_model": "gpt-4o-mini", "proactive": True},
+    {"name": "shed",         "in_flight": 32, "latency_ms": 6000, "rate_429": 0.15,
+     "search_preview": False, "emotion_model": "local",       "proactive": False},
+]
+# 지연 신호에 쓰는 호출: 헤더가 첫 바이트에 오는(= 대기열 시간을 반영하는) 스트리밍 답변/TTS 만
+DEGRADE_LATENCY_ENDPOINTS = ("chat/completions:stream", "audio/speech")
+DEGRADE_LATENCY_EWMA_ALPHA = 0.2   # 지연 EWMA 가중치
+DEGRADE_WINDOW_SEC = 60            # 429 비율 계산 창 / 지연 값 유효 시간
+DEGRADE_MIN_SAMPLES = 10           # 창 내 응답이 이보다 적으면 429 비율 무시
+DEGRADE_RECOVER_RATIO = 0.7        # 회복 판정: 임계치 * 0.7 아래
+DEGRADE_HOLD_SEC = 30              # 단계 변경 후 최소 유지 시간 (회복 시)
+
+# TTS 출력 포맷 / 서버 측 립싱크 엔벨로프
+#   wav 는 표준 라이브러리로 바로 디코드 (Vercel 등 ffmpeg 없는 배포 환경 기본값, 대신 용량 ↑)
+#   mp3 등 압축 포맷은 pydub(ffmpeg)가 있을 때만 엔벨로프 생성, 없으면 클라이언트 기본 립싱크로 대체
+TTS_FORMAT = "wav"               # wav | mp3 | opus | aac | flac
+LIPSYNC_ENABLED = True
+LIPSYNC_FPS = 60                 # 엔벨로프 프레임 수/초 (uint8 1바이트/프레임)
+
+# emotion_model == "local" 일 때 쓰는 키워드 기반 감정 추정
+EMOTION_KEYWORDS = {
+    "희": ["기뻐", "기쁘", "좋아", "좋았", "신나", "행복", "최고", "웃"],
+    "노": ["화나", "화가", "짜증", "열받", "빡치", "분노", "억울"],
+    "애": ["슬퍼", "슬프", "우울", "눈물", "외로", "힘들", "속상"],
+    "낙": ["편안", "여유", "즐거", "재밌", "재미있", "느긋"],
+    "애(사랑)": ["사랑", "좋아해", "보고 싶", "설레", "고마워"],
+    "오": ["싫어", "무서", "불안", "걱정", "두려", "초조", "스트레스"],
+    "욕": ["하고 싶", "갖고 싶", "원해", "목표", "이루고", "잘하고"],
+}
+
 EMOTION_LINKS = {
     "노": [
         ("마음이 편안해지는 음악", "https://www.youtube.com/watch?v=5qap5aO4i9A"),
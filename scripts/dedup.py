@@ -0,0 +1,115 @@
+# scripts/dedup.py
+"""
+중복 작업 회피: 동시 요청 합치기(singleflight) + 오디오 해시 기반 STT 결과 캐시
+
+Flask async 뷰는 요청마다 별도 스레드/이벤트 루프에서 돌기 때문에
+asyncio.Future 대신 스레드 안전한 concurrent.futures.Future 로 결과를 공유한다.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+def audio_digest(data: bytes) -> str:
+    """업로드 오디오 바이트 해시 (캐시/합치기 키)"""
+    return hashlib.sha256(data).hexdigest()
+
+class _Counters:
+    """중복 회피 카운터 (스레드 안전)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, int] = {}
+
+    def inc(self, name: str, n: int = 1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._values)
+
+counters = _Counters()
+
+class SingleFlight:
+    """
+    같은 key 로 동시에 들어온 작업은 선두(leader) 1개만 실행하고
+    나머지는 그 결과(또는 예외)를 그대로 공유한다.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """반환: (결과, 공유 여부)"""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = concurrent.futures.Future()
+                self._calls[key] = fut
+
+        if not leader:
+            counters.inc(f"{self.name}_shared")
+            return await asyncio.wrap_future(fut), True
+
+        counters.inc(f"{self.name}_executed")
+        try:
+            result = await fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+class TTLCache:
+    """짧은 TTL + 최대 개수 제한 LRU 캐시"""
+    def __init__(self, name: str, ttl_sec: float, max_entries: int):
+        self.name = name
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                hit = False
+            else:
+                self._data.move_to_end(key)
+                hit = True
+        counters.inc(f"{self.name}_hits" if hit else f"{self.name}_misses")
+        return item[1] if hit else None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+def stats(*flights: SingleFlight, caches: Tuple[TTLCache, ...] = ()) -> Dict[str, Any]:
+    """/scripts/metrics 용 스냅샷"""
+    out: Dict[str, Any] = {"counters": counters.snapshot()}
+    out["in_flight"] = {f.name: f.in_flight() for f in flights}
+    out["cache_size"] = {c.name: len(c) for c in caches}
+    return out
@@ -0,0 +1,154 @@
+# scripts/degrade.py
+"""
+부하 적응형 품질 단계 조절
+
+실시간 신호(진행 중 턴 수, 업스트림 첫 바이트 지연 EWMA, 429 비율)를 보고
+config.DEGRADE_TIERS 에 정의된 단계로 선택 작업(검색 프리뷰, 감정 모델, 프로액티브 카드)을 줄인다.
+- 올라갈 때(악화): 조건을 만족하는 가장 높은 단계로 즉시 이동
+- 내려올 때(회복): 임계치 * recover_ratio 아래로 hold_sec 이상 유지되면 한 단계씩
+
+지연 신호는 latency_endpoints 에 해당하는 호출만 쓴다. 비스트리밍 생성(검색 프리뷰, gpt-4o 단발,
+Whisper)은 생성이 끝나야 헤더가 오므로 부하가 아니라 "어떤 호출을 했는지"를 따라가기 때문.
+엔드포인트별 EWMA 는 stats() 에 참고용으로만 노출.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    in_flight: int          # 진행 중 턴 수 임계치
+    latency_ms: float       # 업스트림 첫 바이트(헤더 도착) 지연 EWMA 임계치
+    rate_429: float         # 최근 창 내 429 비율 임계치
+    search_preview: bool    # 부정 감정 시 gpt-4o-mini-search-preview 사용 여부
+    emotion_model: str      # "gpt-4o" | "gpt-4o-mini" | "local"(키워드 기반)
+    proactive: bool         # 프로액티브 카드 계산 여부
+
+class DegradeScheduler:
+    def __init__(
+        self,
+        tiers: List[Dict[str, Any]],
+        latency_alpha: float,
+        window_sec: float,
+        recover_ratio: float,
+        hold_sec: float,
+        min_samples: int = 10,
+        latency_endpoints: Optional[Iterable[str]] = None
+    ):
+        self.tiers: List[Tier] = [Tier(**t) for t in tiers]
+        self.latency_alpha = latency_alpha
+        self.window_sec = window_sec
+        self.recover_ratio = recover_ratio
+        self.hold_sec = hold_sec
+        self.min_samples = min_samples
+        # None 이면 모든 호출을 지연 신호에 반영
+        self.latency_endpoints = None if latency_endpoints is None else frozenset(latency_endpoints)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latency_ewma_ms: Optional[float] = None
+        self._last_sample_ts = 0.0
+        self._endpoint_ewma_ms: Dict[str, float] = {}
+        self._responses: Deque[Tuple[float, bool]] = deque()  # (ts, 429 여부)
+        self._level = 0
+        self._changed_at = 0.0
+        self._transitions: Dict[str, int] = {}
+
+    # ---------------- 신호 수집 ----------------
+    @contextmanager
+    def turn(self):
+        self.turn_started()
+        try:
+            yield
+        finally:
+            self.turn_finished()
+
+    def turn_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def turn_finished(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def _ewma(self, prev: Optional[float], ms: float) -> float:
+        return ms if prev is None else self.latency_alpha * ms + (1 - self.latency_alpha) * prev
+
+    def record_upstream(self, latency_sec: float, status_code: int, endpoint: str = ""):
+        """업스트림 HTTP 응답 1건 (UpstreamPool 전송 계층에서 호출)"""
+        now = time.time()
+        ms = latency_sec * 1000.0
+        with self._lock:
+            self._endpoint_ewma_ms[endpoint] = self._ewma(self._endpoint_ewma_ms.get(endpoint), ms)
+            # 429 는 엔드포인트와 무관하게 부하 신호, 지연은 대기열을 반영하는 호출만
+            if self.latency_endpoints is None or endpoint in self.latency_endpoints:
+                self._latency_ewma_ms = self._ewma(self._latency_ewma_ms, ms)
+                self._last_sample_ts = now
+            self._responses.append((now, status_code == 429))
+            self._trim(now)
+
+    def _trim(self, now: float):
+        while self._responses and self._responses[0][0] < now - self.window_sec:
+            self._responses.popleft()
+
+    def _signals(self, now: float) -> Dict[str, float]:
+        self._trim(now)
+        total = len(self._responses)
+        n429 = sum(1 for _, is429 in self._responses if is429)
+        # 창 밖으로 오래된 지연 값은 무시 (트래픽이 끊기면 회복 가능하도록)
+        fresh = self._latency_ewma_ms is not None and now - self._last_sample_ts <= self.window_sec
+        return {
+            "in_flight": float(self._in_flight),
+            "latency_ms": self._latency_ewma_ms if fresh else 0.0,
+            "rate_429": n429 / total if total >= self.min_samples else 0.0,
+        }
+
+    # ---------------- 단계 결정 ----------------
+    def _target(self, sig: Dict[str, float], scale: float) -> int:
+        level = 0
+        for i, t in enumerate(self.tiers[1:], start=1):
+            if (sig["in_flight"] >= t.in_flight * scale
+                    or sig["latency_ms"] >= t.latency_ms * scale
+                    or sig["rate_429"] >= t.rate_429 * scale):
+                level = i
+        return level
+
+    def current(self) -> Tier:
+        """신호를 평가해 현재 단계 반환 (턴 시작 시 1회 호출)"""
+        now = time.time()
+        with self._lock:
+            sig = self._signals(now)
+            up = self._target(sig, 1.0)
+            if up > self._level:
+                self._move(up, now, sig)
+            elif self._level > 0 and now - self._changed_at >= self.hold_sec:
+                if self._target(sig, self.recover_ratio) < self._level:
+                    self._move(self._level - 1, now, sig)
+            return self.tiers[self._level]
+
+    def _move(self, level: int, now: float, sig: Dict[str, float]):
+        prev = self.tiers[self._level].name
+        self._level = level
+        self._changed_at = now
+        name = self.tiers[level].name
+        key = f"{prev}->{name}"
+        self._transitions[key] = self._transitions.get(key, 0) + 1
+        print(f"품질 단계 변경: {key} (in_flight={int(sig['in_flight'])}, "
+              f"latency={sig['latency_ms']:.0f}ms, 429={sig['rate_429']:.2%})")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            sig = self._signals(now)
+            return {
+                "tier": self.tiers[self._level].name,
+                "level": self._level,
+                "since": int(self._changed_at) or None,
+                "signals": {k: round(v, 4) for k, v in sig.items()},
+                "transitions": dict(self._transitions),
+                "latency_ms_by_endpoint": {k: round(v, 1) for k, v in self._endpoint_ewma_ms.items()},
+            }
@@ -0,0 +1,155 @@
+# scripts/lipsync.py
+"""
+TTS 오디오 → 립싱크 입모양 엔벨로프 (서버에서 1회 계산)
+
+오디오를 한 번 디코드해 fps(기본 60Hz) 프레임별 RMS 를 numpy 로 한꺼번에 구하고
+0~255 uint8 로 양자화해 base64 로 내려준다. 클라이언트는 재생 위치로 인덱싱만 해서
+ParamMouthOpenY 에 넣는다 (프레임별 분석 없음).
+
+벤치마크)
+    python -m scripts.lipsync bench reply1.mp3 reply2.wav --repeat 20
+"""
+import argparse
+import base64
+import io
+import sys
+import threading
+import time
+import wave
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+PCM_SAMPLE_RATE = 24000  # OpenAI TTS pcm 출력 (16bit LE mono)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {"replies": 0, "failures": 0, "decode_ms": 0.0, "envelope_ms": 0.0}
+_ffmpeg_missing = False
+
+# ======================================================================================
+# 디코드
+# ======================================================================================
+def _int16_to_float(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+
+def decode_audio(data: bytes, fmt: str) -> Optional[Tuple[np.ndarray, int]]:
+    """오디오 바이트 → (mono float32 [-1, 1], sample_rate). 디코드 불가 시 None"""
+    if fmt == "pcm":
+        return _int16_to_float(data[: len(data) // 2 * 2]), PCM_SAMPLE_RATE
+    if fmt == "wav":
+        try:
+            with wave.open(io.BytesIO(data)) as w:
+                sr, ch, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+                raw = w.readframes(w.getnframes())
+        except (wave.Error, EOFError):
+            # 스트리밍 TTS 의 wav 는 헤더 길이 필드가 비어 있을 수 있음 → 44바이트 헤더 뒤를 16bit mono 로 간주
+            return _int16_to_float(data[44:][: (len(data) - 44) // 2 * 2]), PCM_SAMPLE_RATE
+        if width != 2:
+            return None
+        samples = _int16_to_float(raw)
+        if ch > 1:
+            samples = samples.reshape(-1, ch).mean(axis=1)
+        return samples, sr
+    # mp3/opus/aac/flac: pydub(ffmpeg) 필요 — 없으면 엔벨로프 생략 (매 응답 프로세스 실행 시도하지 않도록 기억)
+    global _ffmpeg_missing
+    if _ffmpeg_missing:
+        return None
+    try:
+        from pydub import AudioSegment
+        seg = AudioSegment.from_file(io.BytesIO(data), format=fmt).set_channels(1).set_sample_width(2)
+    except (ImportError, FileNotFoundError) as e:
+        _ffmpeg_missing = True
+        print(f"립싱크 엔벨로프 비활성화({fmt} 디코더 없음, TTS_FORMAT='wav' 권장): {e}")
+        return None
+    except Exception as e:
+        print(f"립싱크용 오디오 디코드 실패({fmt}): {e}")
+        return None
+    return _int16_to_float(seg.raw_data), seg.frame_rate
+
+# ======================================================================================
+# 엔벨로프
+# ======================================================================================
+def envelope(samples: np.ndarray, sample_rate: int, fps: int) -> np.ndarray:
+    """프레임별 RMS → 정규화/압축 → uint8"""
+    if samples.size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    hop = sample_rate / fps
+    n_frames = int(np.ceil(samples.size / hop))
+    starts = np.floor(np.arange(n_frames) * hop).astype(np.int64)
+    counts = np.diff(np.append(starts, samples.size))
+    rms = np.sqrt(np.add.reduceat(samples.astype(np.float32) ** 2, starts) / np.maximum(counts, 1))
+
+    # 발화 구간 기준(상위 5%)으로 정규화, 감마로 작은 소리도 입이 열리게
+    ref = float(np.percentile(rms, 95)) or 1.0
+    level = np.clip(rms / ref, 0.0, 1.0) ** 0.6
+    # 3프레임 이동평균으로 떨림 완화
+    level = np.convolve(level, np.ones(3, dtype=np.float32) / 3, mode="same")
+    return np.round(level * 255).astype(np.uint8)
+
+def compute(data: bytes, fmt: str, fps: int) -> Optional[Dict[str, Any]]:
+    """TTS 오디오 → {"fps", "frames", "env"(base64 uint8)}. 실패 시 None"""
+    t0 = time.perf_counter()
+    decoded = decode_audio(data, fmt)
+    t1 = time.perf_counter()
+    if decoded is None:
+        with _stats_lock:
+            _stats["failures"] += 1
+        return None
+    env = envelope(decoded[0], decoded[1], fps)
+    t2 = time.perf_counter()
+    with _stats_lock:
+        _stats["replies"] += 1
+        _stats["decode_ms"] += (t1 - t0) * 1000
+        _stats["envelope_ms"] += (t2 - t1) * 1000
+    return {"fps": fps, "frames": int(env.size), "env": base64.b64encode(env.tobytes()).decode()}
+
+def stats() -> Dict[str, Any]:
+    """/scripts/metrics 용: 응답당 평균 디코드/엔벨로프 비용"""
+    with _stats_lock:
+        n = _stats["replies"]
+        return {
+            "replies": int(n),
+            "failures": int(_stats["failures"]),
+            "decode_ms_avg": round(_stats["decode_ms"] / n, 3) if n else None,
+            "envelope_ms_avg": round(_stats["envelope_ms"] / n, 3) if n else None,
+        }
+
+# ======================================================================================
+# 벤치마크 CLI
+# ======================================================================================
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m scripts.lipsync", description="립싱크 엔벨로프 계산 비용 측정")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("files", nargs="+", help="TTS 오디오 파일 (확장자로 포맷 판단)")
+    p_bench.add_argument("--fps", type=int, default=60)
+    p_bench.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        fmt = path.rsplit(".", 1)[-1].lower()
+        with open(path, "rb") as f:
+            data = f.read()
+        decode_ms: List[float] = []
+        env_ms: List[float] = []
+        decoded = None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            decoded = decode_audio(data, fmt)
+            t1 = time.perf_counter()
+            if decoded is None:
+                break
+            env = envelope(decoded[0], decoded[1], args.fps)
+            t2 = time.perf_counter()
+            decode_ms.append((t1 - t0) * 1000)
+            env_ms.append((t2 - t1) * 1000)
+        if decoded is None:
+            print(f"{path}: 디코드 실패")
+            continue
+        duration = decoded[0].size / decoded[1]
+        print(f"{path}: {duration:.2f}s audio, {env.size} frames ({env.nbytes} B), "
+              f"decode {np.median(decode_ms):.2f}ms, envelope {np.median(env_ms):.2f}ms (median of {len(env_ms)})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
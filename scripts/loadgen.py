@@ -0,0 +1,175 @@
+# scripts/loadgen.py
+"""
+간단한 부하/지연 측정 하네스 — 실행 중인 서버에 녹음 파일을 반복 업로드
+
+가상 사용자 1명 = (옵션) /scripts/prewarm → 녹음 시간만큼 대기 → /scripts/chat(_stream) 업로드.
+지연은 "녹음 종료(업로드 시작) → 응답 완료" 구간으로 잰다 (사용자가 체감하는 구간).
+
+사용 예)
+    python -m scripts.loadgen --audio sample.webm --requests 20 --concurrency 4
+    python -m scripts.loadgen --audio sample.webm --requests 20 --concurrency 4 --prewarm
+    python -m scripts.loadgen --audio sample.webm --stream --framing token
+    python -m scripts.loadgen --audio sample.webm --stream --framing compact --accept-encoding gzip
+"""
+import argparse
+import codecs
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+try:  # 선택 의존성 (br 응답 해제용)
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[idx]
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "max": None}
+    return {
+        "mean": round(statistics.fmean(values), 4),
+        "p50": round(_percentile(values, 0.50), 4),
+        "p95": round(_percentile(values, 0.95), 4),
+        "max": round(max(values), 4),
+    }
+
+class _Runner:
+    def __init__(self, args: argparse.Namespace, audio: bytes):
+        self.args = args
+        self.audio = audio
+        self.session = requests.Session()
+
+    def _headers(self, session_id: str) -> Dict[str, str]:
+        return {"X-API-KEY": self.args.api_key or "", "X-SESSION-ID": session_id,
+                "Accept-Encoding": self.args.accept_encoding}
+
+    def _audio_bytes(self) -> bytes:
+        # STT 캐시/요청 합치기를 피하려면 매 요청 오디오 끝에 임의 바이트를 덧붙인다 (컨테이너 뒤 쓰레기 바이트)
+        if self.args.bust_cache:
+            return self.audio + os.urandom(16)
+        return self.audio
+
+    def one(self, i: int) -> Dict[str, Any]:
+        session_id = f"loadgen-{uuid.uuid4().hex[:8]}"
+        base = self.args.url.rstrip("/")
+        if self.args.prewarm:
+            self.session.post(f"{base}/scripts/prewarm", data={"character": self.args.character},
+                              headers=self._headers(session_id), timeout=10)
+        time.sleep(self.args.record_sec)
+
+        files = {"audio": ("audio.webm", self._audio_bytes(), "audio/webm")}
+        data = {"character": self.args.character}
+        if self.args.framing:
+            data["framing"] = self.args.framing
+        path = "/scripts/chat_stream" if self.args.stream else "/scripts/chat"
+        t0 = time.perf_counter()
+        result: Dict[str, Any] = {"i": i, "ok": False}
+        try:
+            resp = self.session.post(f"{base}{path}", files=files, data=data,
+                                     headers=self._headers(session_id), timeout=self.args.timeout,
+                                     stream=self.args.stream)
+            result["status"] = resp.status_code
+            if not self.args.stream:
+                body = resp.content
+                result["bytes"] = len(body)
+            else:
+                result.update(self._read_stream(resp, t0))
+            result["latency"] = time.perf_counter() - t0
+            result["ok"] = resp.status_code == 200
+        except requests.RequestException as e:
+            result["error"] = str(e)
+        return result
+
+    @staticmethod
+    def _read_stream(resp: requests.Response, t0: float) -> Dict[str, Any]:
+        """SSE 본문을 읽으며 전송(압축) 바이트/이벤트 수, 첫 토큰·meta·final 도착 시각 기록"""
+        out: Dict[str, Any] = {"bytes": 0, "events": 0}
+        encoding = resp.headers.get("Content-Encoding", "")
+        if encoding == "gzip":
+            decompress = zlib.decompressobj(31).decompress
+        elif encoding == "br" and brotli is not None:
+            decompress = brotli.Decompressor().process
+        else:
+            decompress = lambda b: b
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buf = ""
+        for chunk in resp.raw.stream(8192, decode_content=False):
+            now = time.perf_counter() - t0
+            out["bytes"] += len(chunk)
+            buf += decoder.decode(decompress(chunk))
+            while "\n\n" in buf:
+                frame, buf = buf.split("\n\n", 1)
+                ev = next((l[6:].strip() for l in frame.split("\n") if l.startswith("event:")), "")
+                if not ev:
+                    continue
+                out["events"] += 1
+                key = {"meta": "t_meta", "final": "t_final"}.get(ev, "t_first_token")
+                out.setdefault(key, now)
+        return out
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m scripts.loadgen", description="채팅 엔드포인트 부하/지연 측정")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--audio", required=True, help="업로드할 녹음 파일(webm)")
+    parser.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"))
+    parser.add_argument("--character", default="kei")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--record-sec", type=float, default=3.0, help="프리웜 후 업로드까지 대기(녹음 시간 가정)")
+    parser.add_argument("--prewarm", action="store_true", help="녹음 시작 시 /scripts/prewarm 호출")
+    parser.add_argument("--stream", action="store_true", help="/scripts/chat_stream 사용")
+    parser.add_argument("--framing", choices=["token", "compact"], help="스트리밍 프레이밍 (기본: 서버 설정)")
+    parser.add_argument("--accept-encoding", default="identity", help="예: identity | gzip | br")
+    parser.add_argument("--bust-cache", action="store_true", help="요청마다 오디오를 살짝 바꿔 STT 캐시/합치기 우회")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="요약을 JSON 으로 출력")
+    args = parser.parse_args(argv)
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    runner = _Runner(args, audio)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(runner.one, range(args.requests)))
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if r["ok"]]
+    summary: Dict[str, Any] = {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_sec": round(wall, 3),
+        "prewarm": args.prewarm,
+        "stream": args.stream,
+        "latency_sec": _summary([r["latency"] for r in ok]),
+        "bytes_per_reply": _summary([float(r["bytes"]) for r in ok]),
+    }
+    if args.stream:
+        summary["events_per_reply"] = _summary([float(r["events"]) for r in ok])
+        for key in ("t_first_token", "t_meta", "t_final"):
+            summary[key] = _summary([r[key] for r in ok if key in r])
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        for k, v in summary.items():
+            print(f"{k:>16}: {v}")
+    return 0 if not summary["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+# scripts/logstore.py
+"""
+턴 로그(log_data) 컬럼형 로컬 저장소
+
+- compact: 다운로드한 JSON 로그(턴 1개 = 파일 1개)를 numpy 컬럼 + 문자열 사전으로 접어서 저장
+- query  : memmap 으로 열어 시간/세션/감정 인덱스를 이용해 집계
+
+사용 예)
+    python -m scripts.logstore compact ./downloaded_logs ./logstore
+    python -m scripts.logstore query ./logstore emotion-hourly --since 2025-06-01
+    python -m scripts.logstore query ./logstore card-acceptance
+    python -m scripts.logstore query ./logstore character-turns --session default-session
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+import numpy as np
+
+# 칠정 고정 어휘 (컬럼 인덱스 순서 = emotion_pct 열 순서)
+EMOTIONS: List[str] = ["희", "노", "애", "낙", "애(사랑)", "오", "욕"]
+_EMO_INDEX = {e: i for i, e in enumerate(EMOTIONS)}
+UNKNOWN_EMOTION = len(EMOTIONS)  # top_emotion 이 어휘 밖일 때
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+
+# 고정 폭 컬럼: 이름 -> dtype
+COLUMNS: Dict[str, str] = {
+    "ts": "int64",           # epoch 초 (오름차순 정렬 = 시간 인덱스)
+    "session": "int32",      # sessions 사전 코드
+    "character": "int16",    # characters 사전 코드
+    "top_emotion": "int8",   # EMOTIONS 인덱스 (UNKNOWN_EMOTION 포함)
+    "card_type": "int16",    # card_types 사전 코드, 카드 없음 = -1
+    "accepted": "int8",      # 1 수용 / 0 거절 / -1 피드백 없음
+}
+
+# ======================================================================================
+# 원본 로그 읽기
+# ======================================================================================
+def _parse_ts(value: Any) -> Optional[int]:
+    """로그 timestamp(ISO 문자열, '...+00:00Z' 형태 포함) -> epoch 초"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str) or not value:
+        return None
+    s = value.strip()
+    if s.endswith("Z"):
+        s = s[:-1]  # 오프셋 없으면 아래에서 UTC 로 간주
+    try:
+        dt = datetime.datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+def _iter_source_records(src: str) -> Iterator[Dict[str, Any]]:
+    """디렉터리(재귀) 또는 단일 파일에서 레코드 읽기: .json(dict/list), .jsonl/.ndjson"""
+    if os.path.isfile(src):
+        paths = [src]
+    else:
+        paths = []
+        for root, _, files in os.walk(src):
+            for name in files:
+                if name.endswith((".json", ".jsonl", ".ndjson")):
+                    paths.append(os.path.join(root, name))
+        paths.sort()
+
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                if path.endswith(".json"):
+                    data = json.load(f)
+                    items = data if isinstance(data, list) else [data]
+                    for item in items:
+                        if isinstance(item, dict):
+                            yield item
+                else:
+                    # 줄 단위로 건너뜀 (깨진 줄 하나 때문에 나머지 줄을 버리지 않도록)
+                    for lineno, line in enumerate(f, 1):
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            item = json.loads(line)
+                        except ValueError as e:
+                            print(f"로그 줄 건너뜀({path}:{lineno}): {e}", file=sys.stderr)
+                            continue
+                        if isinstance(item, dict):
+                            yield item
+        except (OSError, ValueError) as e:
+            print(f"로그 파일 건너뜀({path}): {e}", file=sys.stderr)
+
+# ======================================================================================
+# 컴팩션
+# ======================================================================================
+class _StringDict:
+    """문자열 -> 정수 코드 사전 (등장 순서대로 코드 부여)"""
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        c = self._codes.get(value)
+        if c is None:
+            c = len(self.values)
+            self._codes[value] = c
+            self.values.append(value)
+        return c
+
+def _csr_index(codes: np.ndarray, n_keys: int) -> Tuple[np.ndarray, np.ndarray]:
+    """코드 컬럼 -> (rows, offsets). key k 의 행 = rows[offsets[k]:offsets[k+1]] (시간순 유지)"""
+    rows = np.argsort(codes, kind="stable").astype(np.int64)
+    counts = np.bincount(codes.astype(np.int64), minlength=n_keys)
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return rows, offsets
+
+def compact(src: str, dest: str) -> Dict[str, Any]:
+    """원본 로그를 컬럼형 저장소로 접는다. 기존 저장소는 덮어씀."""
+    turns: List[Dict[str, Any]] = []
+    feedbacks: List[Dict[str, Any]] = []
+    skipped = 0
+    for rec in _iter_source_records(src):
+        ts = _parse_ts(rec.get("timestamp"))
+        if ts is None:
+            skipped += 1
+            continue
+        rec["_ts"] = ts
+        if rec.get("event") == "proactive_feedback":
+            feedbacks.append(rec)
+        else:
+            turns.append(rec)
+
+    turns.sort(key=lambda r: r["_ts"])
+    n = len(turns)
+
+    sessions, characters, card_types = _StringDict(), _StringDict(), _StringDict()
+    cols = {name: np.empty(n, dtype=dt) for name, dt in COLUMNS.items()}
+    emotion_pct = np.zeros((n, len(EMOTIONS)), dtype=np.float32)
+
+    for i, rec in enumerate(turns):
+        cols["ts"][i] = rec["_ts"]
+        cols["session"][i] = sessions.code(str(rec.get("session_id") or "default-session"))
+        cols["character"][i] = characters.code(str(rec.get("character") or "-"))
+        cols["top_emotion"][i] = _EMO_INDEX.get(rec.get("top_emotion"), UNKNOWN_EMOTION)
+        card = rec.get("proactive_card")
+        if isinstance(card, dict):
+            cols["card_type"][i] = card_types.code(str(card.get("card_type") or card.get("type_key") or "info"))
+        else:
+            cols["card_type"][i] = -1
+        cols["accepted"][i] = -1
+        pct = rec.get("emotion_percent")
+        if isinstance(pct, dict):
+            for emo, v in pct.items():
+                j = _EMO_INDEX.get(emo)
+                if j is not None:
+                    try:
+                        emotion_pct[i, j] = float(v)
+                    except (TypeError, ValueError):
+                        pass
+
+    # 피드백 -> 같은 세션에서 피드백 이전 가장 최근의 (아직 응답 없는) 카드 행에 결합
+    card_rows_by_session: Dict[int, List[int]] = {}
+    for i in np.flatnonzero(cols["card_type"] >= 0):
+        card_rows_by_session.setdefault(int(cols["session"][i]), []).append(int(i))
+    unmatched = 0
+    for fb in sorted(feedbacks, key=lambda r: r["_ts"]):
+        sid = sessions._codes.get(str(fb.get("session_id") or "default-session"))
+        rows = card_rows_by_session.get(sid, []) if sid is not None else []
+        target = None
+        for i in reversed(rows):
+            if cols["ts"][i] <= fb["_ts"] and cols["accepted"][i] < 0:
+                target = i
+                break
+        if target is None:
+            unmatched += 1
+            continue
+        cols["accepted"][target] = 1 if fb.get("accepted") else 0
+
+    os.makedirs(dest, exist_ok=True)
+    for name, arr in cols.items():
+        np.save(os.path.join(dest, f"{name}.npy"), arr)
+    np.save(os.path.join(dest, "emotion_pct.npy"), emotion_pct)
+
+    # 세션/감정 인덱스 (CSR)
+    for name, n_keys in (("session", len(sessions.values)), ("top_emotion", len(EMOTIONS) + 1)):
+        rows, offsets = _csr_index(cols[name], n_keys)
+        np.save(os.path.join(dest, f"idx_{name}_rows.npy"), rows)
+        np.save(os.path.join(dest, f"idx_{name}_offsets.npy"), offsets)
+
+    meta = {
+        "version": STORE_VERSION,
+        "rows": n,
+        "emotions": EMOTIONS,
+        "sessions": sessions.values,
+        "characters": characters.values,
+        "card_types": card_types.values,
+        "feedback_matched": len(feedbacks) - unmatched,
+        "feedback_unmatched": unmatched,
+        "skipped": skipped,
+        "compacted_at": int(time.time()),
+    }
+    with open(os.path.join(dest, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+# ======================================================================================
+# 조회
+# ======================================================================================
+class LogStore:
+    """memmap 으로 연 컬럼형 로그 저장소"""
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"지원하지 않는 저장소 버전: {self.meta.get('version')}")
+        self.path = path
+        self.rows: int = self.meta["rows"]
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.ts = load("ts")
+        self.session = load("session")
+        self.character = load("character")
+        self.top_emotion = load("top_emotion")
+        self.card_type = load("card_type")
+        self.accepted = load("accepted")
+        self.emotion_pct = load("emotion_pct")
+        self._idx = {
+            name: (load(f"idx_{name}_rows"), load(f"idx_{name}_offsets"))
+            for name in ("session", "top_emotion")
+        }
+
+    def _index_rows(self, name: str, code: int) -> np.ndarray:
+        rows, offsets = self._idx[name]
+        return np.asarray(rows[offsets[code]:offsets[code + 1]])
+
+    def select(
+        self,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        session: Optional[str] = None,
+        emotion: Optional[str] = None,
+    ) -> np.ndarray:
+        """조건에 맞는 행 번호(오름차순). 시간은 정렬 이진탐색, 세션/감정은 CSR 인덱스 사용"""
+        lo = 0 if since is None else int(np.searchsorted(self.ts, since, side="left"))
+        hi = self.rows if until is None else int(np.searchsorted(self.ts, until, side="left"))
+        sel: Optional[np.ndarray] = None
+
+        for name, value, vocab in (
+            ("session", session, self.meta["sessions"]),
+            ("top_emotion", emotion, self.meta["emotions"]),
+        ):
+            if value is None:
+                continue
+            if value not in vocab:
+                return np.empty(0, dtype=np.int64)
+            rows = self._index_rows(name, vocab.index(value))
+            rows = rows[(rows >= lo) & (rows < hi)]
+            sel = rows if sel is None else np.intersect1d(sel, rows, assume_unique=True)
+
+        return np.arange(lo, hi, dtype=np.int64) if sel is None else sel
+
+    # ---------------- 집계 ----------------
+    def emotion_hourly(self, rows: np.ndarray, tz_offset_hours: int = 9) -> Dict[int, Dict[str, int]]:
+        """시간대(0~23)별 top_emotion 분포"""
+        k = len(EMOTIONS) + 1
+        hours = ((np.asarray(self.ts[rows]) + tz_offset_hours * 3600) // 3600) % 24
+        counts = np.bincount(hours * k + np.asarray(self.top_emotion[rows], dtype=np.int64),
+                             minlength=24 * k).reshape(24, k)
+        labels = EMOTIONS + ["?"]
+        return {
+            h: {labels[j]: int(c) for j, c in enumerate(counts[h]) if c}
+            for h in range(24) if counts[h].any()
+        }
+
+    def card_acceptance(self, rows: np.ndarray) -> Dict[str, Dict[str, Any]]:
+        """card_type 별 노출/수용/거절/수용률"""
+        card = np.asarray(self.card_type[rows], dtype=np.int64)
+        acc = np.asarray(self.accepted[rows])
+        shown_mask = card >= 0
+        n = len(self.meta["card_types"])
+        shown = np.bincount(card[shown_mask], minlength=n)
+        accepted = np.bincount(card[shown_mask & (acc == 1)], minlength=n)
+        rejected = np.bincount(card[shown_mask & (acc == 0)], minlength=n)
+        out: Dict[str, Dict[str, Any]] = {}
+        for i, name in enumerate(self.meta["card_types"]):
+            if not shown[i]:
+                continue
+            answered = int(accepted[i] + rejected[i])
+            out[name] = {
+                "shown": int(shown[i]),
+                "accepted": int(accepted[i]),
+                "rejected": int(rejected[i]),
+                "accept_rate": round(accepted[i] / answered, 4) if answered else None,
+            }
+        return out
+
+    def character_turns(self, rows: np.ndarray) -> Dict[str, int]:
+        """캐릭터별 턴 수"""
+        counts = np.bincount(np.asarray(self.character[rows], dtype=np.int64),
+                             minlength=len(self.meta["characters"]))
+        return {name: int(c) for name, c in zip(self.meta["characters"], counts) if c}
+
+QUERIES = {
+    "emotion-hourly": "emotion_hourly",
+    "card-acceptance": "card_acceptance",
+    "character-turns": "character_turns",
+}
+
+# ======================================================================================
+# CLI
+# ======================================================================================
+def _cli_ts(value: str) -> int:
+    """argparse type= 용 (형식 오류는 usage 메시지로)"""
+    ts = _parse_ts(value)
+    if ts is None:
+        raise argparse.ArgumentTypeError(f"시간 형식 오류: {value}")
+    return ts
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m scripts.logstore", description="턴 로그 컬럼형 저장소")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_compact = sub.add_parser("compact", help="JSON 로그 -> 컬럼형 저장소")
+    p_compact.add_argument("src", help="로그 디렉터리 또는 파일(.json/.jsonl/.ndjson)")
+    p_compact.add_argument("dest", help="저장소 디렉터리")
+
+    p_query = sub.add_parser("query", help="집계 조회")
+    p_query.add_argument("store", help="저장소 디렉터리")
+    p_query.add_argument("name", choices=sorted(QUERIES))
+    p_query.add_argument("--since", type=_cli_ts, help="ISO 시간 (포함)")
+    p_query.add_argument("--until", type=_cli_ts, help="ISO 시간 (미포함)")
+    p_query.add_argument("--session")
+    p_query.add_argument("--emotion", choices=EMOTIONS)
+    p_query.add_argument("--tz-offset", type=int, default=9, help="emotion-hourly 시간대 오프셋(시간, 기본 KST)")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compact":
+        t0 = time.perf_counter()
+        meta = compact(args.src, args.dest)
+        print(f"{meta['rows']}개 턴 컴팩션 완료 ({(time.perf_counter() - t0) * 1000:.1f}ms), "
+              f"피드백 결합 {meta['feedback_matched']} / 미결합 {meta['feedback_unmatched']}, 건너뜀 {meta['skipped']}")
+        return 0
+
+    store = LogStore(args.store)
+    t0 = time.perf_counter()
+    rows = store.select(args.since, args.until, args.session, args.emotion)
+    fn = getattr(store, QUERIES[args.name])
+    result = fn(rows, args.tz_offset) if args.name == "emotion-hourly" else fn(rows)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    print(json.dumps({"rows": int(len(rows)), "elapsed_ms": round(elapsed_ms, 3), "result": result},
+                     ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,7 @@ from flask import render_template, request, Blueprint, jsonify
 # 기존 단일 응답 처리
 from scripts.services import process_chat
 # NEW: 스트리밍/피드백 핸들러
-from scripts.services import stream_chat, proactive_feedback
+from scripts.services import stream_chat, proactive_feedback, metrics, prewarm
 
 bp = Blueprint("api", __name__)
 
@@ -23,7 +23,17 @@ def register_routes(app):
     async def chat_stream():
         return await stream_chat(request)
 
+    # 녹음 시작 시 프리웜 (연결/세션 상태 미리 준비)
+    @app.route('/scripts/prewarm', methods=['POST'])
+    def prewarm_route():
+        return prewarm()
+
     # NEW: 프로액티브 카드 수용/거절 피드백 수집
     @app.route('/proactive/feedback', methods=['POST'])
     def proactive_feedback_route():
         return proactive_feedback()
+
+    # 운영 지표(중복 회피 카운터 등)
+    @app.route('/scripts/metrics', methods=['GET'])
+    def metrics_route():
+        return jsonify(metrics())
\ No newline at end of file
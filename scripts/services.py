@@ -1,6 +1,7 @@
 # scripts/services.py
 import base64
 import asyncio
+import hashlib
 import threading
 import json
 import requests
@@ -8,15 +9,23 @@ import datetime
 import random
 import re
 import time
+from dataclasses import dataclass
 from typing import Dict, Any, List, Tuple, Literal, Optional
 
-from flask import jsonify, abort, request, Response, stream_with_context
+from flask import jsonify, abort, request, Response
 from openai import AsyncOpenAI
 
 from scripts.config import (
     VERCEL_TOKEN, VERCEL_PROJ_ID,
     CHARACTER_SYSTEM_PROMPTS, CHARACTER_VOICE,
-    EMOTION_LINKS, HISTORY_MAX_LEN
+    EMOTION_LINKS, HISTORY_MAX_LEN,
+    STT_CACHE_TTL_SEC, STT_CACHE_MAX_ENTRIES,
+    UPSTREAM_MAX_CLIENTS, UPSTREAM_KEEPALIVE_SEC, PREWARM_SLOT_TTL_SEC,
+    SSE_FRAMING, SSE_FLUSH_MS, SSE_FLUSH_BYTES, SSE_COMPRESSION,
+    DEGRADE_TIERS, DEGRADE_LATENCY_EWMA_ALPHA, DEGRADE_WINDOW_SEC, DEGRADE_RECOVER_RATIO, DEGRADE_HOLD_SEC,
+    DEGRADE_MIN_SAMPLES, DEGRADE_LATENCY_ENDPOINTS,
+    EMOTION_KEYWORDS,
+    TTS_FORMAT, LIPSYNC_ENABLED, LIPSYNC_FPS
 )
 from scripts.utils import (
     remove_empty_parentheses, markdown_to_html_links,
@@ -25,17 +34,60 @@ from scripts.utils import (
 
 # ▼ 프로액티브 정책(쿨다운/거절률/개인화 밴딧) — 별도 모듈
 from scripts.proactive import ProactivePolicy, SuggestionType
+# ▼ 중복 작업 회피(동시 요청 합치기 / STT 캐시)
+from scripts import dedup
+from scripts.dedup import audio_digest
+# ▼ 업스트림 연결 풀(백그라운드 루프 + API 키별 클라이언트)
+from scripts.upstream import UpstreamPool, RateLimiter
+# ▼ SSE 프레이밍(토큰 묶음/압축)
+from scripts import sse
+# ▼ 부하 적응형 품질 단계
+from scripts.degrade import DegradeScheduler, Tier
+# ▼ TTS 오디오 → 립싱크 엔벨로프
+from scripts import lipsync
 
 # ======================================================================================
 # 글로벌 상태
 # ======================================================================================
 conversation_history: List[Dict[str, Any]] = []
 history_lock = threading.Lock()
+_history_version = 0  # conversation_history 변경 시 증가 (프리웜 스냅샷 유효성 확인용)
 
 # 프로액티브 정책/세션 상태
 _policy = ProactivePolicy()
+_policy_lock = threading.Lock()  # _policy / _last_user_utter_ts 갱신은 이 락 안에서만
 _last_user_utter_ts: Dict[str, float] = {}  # session_id -> last user ts
 
+# 중복 작업 회피: /scripts/chat 동시 요청 합치기, STT 합치기 + 오디오 해시 -> 전사 결과 캐시
+_chat_flight = dedup.SingleFlight("chat")
+_stt_flight  = dedup.SingleFlight("stt")
+_stt_cache   = dedup.TTLCache("stt_cache", STT_CACHE_TTL_SEC, STT_CACHE_MAX_ENTRIES)
+
+# 부하 적응형 품질 단계 (업스트림 지연/429 는 연결 풀 전송 계층에서 수집)
+_degrade = DegradeScheduler(
+    DEGRADE_TIERS, DEGRADE_LATENCY_EWMA_ALPHA, DEGRADE_WINDOW_SEC, DEGRADE_RECOVER_RATIO, DEGRADE_HOLD_SEC,
+    DEGRADE_MIN_SAMPLES, DEGRADE_LATENCY_ENDPOINTS
+)
+
+# 업스트림 연결 풀 + 녹음 시작 시 미리 채워두는 세션별 슬롯
+_upstream = UpstreamPool(UPSTREAM_MAX_CLIENTS, UPSTREAM_KEEPALIVE_SEC, observer=_degrade.record_upstream)
+
+@dataclass
+class PrewarmSlot:
+    """/scripts/prewarm 이 채워두는 세션별 턴 준비 상태 (짧은 TTL, 1회 사용)"""
+    expires_at: float
+    character: str
+    history_version: int
+    messages: List[Dict[str, Any]]
+
+_prewarm_slots: Dict[str, PrewarmSlot] = {}
+_prewarm_lock = threading.Lock()
+_prewarm_stats: Dict[str, int] = {"requests": 0, "slot_hits": 0, "slot_misses": 0}
+
+# 스트리밍 전송량 통계: "framing/encoding" -> {replies, events, bytes_raw, bytes_wire}
+_stream_stats: Dict[str, Dict[str, int]] = {}
+_stream_stats_lock = threading.Lock()
+
 # ======================================================================================
 # 링크 후처리 유틸
 # ======================================================================================
@@ -144,13 +196,89 @@ def _build_suggestion_card(s_types: List[SuggestionType], emotion: str, reason:
         "type_key": card_type
     }
 
+def _decide_proactive_card(session_id: str, user_text: str, top_emotion: str) -> Optional[Dict[str, Any]]:
+    """침묵 시간 갱신 + 정책 판단 + 카드 생성 (스레드 안전)"""
+    topic_hint = _topic_hint_from_text(user_text)
+    with _policy_lock:
+        last_ts = _last_user_utter_ts.get(session_id, 0.0)
+        now_ts  = time.time()
+        silence_sec = now_ts - last_ts if last_ts > 0 else 0.0
+        _last_user_utter_ts[session_id] = now_ts
+
+        suggest_res = _policy.should_suggest(
+            sid=session_id,
+            emotion=top_emotion,
+            last_utter_silence_sec=silence_sec,
+            topic=topic_hint
+        )
+        if not suggest_res.get("ok"):
+            return None
+        s_types = _policy.choose_suggestion_types(session_id)
+        reason  = f"감정={top_emotion}, 침묵={int(silence_sec)}s, topic={topic_hint or '-'}"
+        _policy.stamp_suggested(session_id, reason)
+    return _build_suggestion_card(s_types, top_emotion, reason)
+
 # ======================================================================================
 # 공통 I/O
 # ======================================================================================
 def get_openai_client(api_key: str):
     if not api_key:
         abort(401, description="OpenAI API 키가 필요합니다.")
-    return AsyncOpenAI(api_key=api_key)
+    # 키별 클라이언트 재사용 (연결은 업스트림 루프에서만 사용)
+    return _upstream.client_for(api_key)
+
+def _snapshot_messages(character: str) -> Tuple[int, List[Dict[str, Any]]]:
+    with history_lock:
+        messages = [{"role": "system", "content": CHARACTER_SYSTEM_PROMPTS[character]}] + conversation_history[-HISTORY_MAX_LEN:]
+        return _history_version, messages
+
+def _base_messages(session_id: str, character: str) -> List[Dict[str, Any]]:
+    """시스템 프롬프트 + 최근 대화. 프리웜 슬롯이 유효하면 그 스냅샷을 그대로 사용"""
+    now = time.time()
+    with _prewarm_lock:
+        slot = _prewarm_slots.pop(session_id, None)
+        # 만료 슬롯 정리
+        for sid in [sid for sid, sl in _prewarm_slots.items() if sl.expires_at < now]:
+            del _prewarm_slots[sid]
+    if (slot and slot.character == character and slot.expires_at >= now
+            and slot.history_version == _history_version):
+        with _prewarm_lock:
+            _prewarm_stats["slot_hits"] += 1
+        return slot.messages
+    with _prewarm_lock:
+        _prewarm_stats["slot_misses"] += 1
+    return _snapshot_messages(character)[1]
+
+def _local_emotion(user_text: str) -> Tuple[Dict[str, Any], str]:
+    """키워드 기반 감정 추정 (부하 최상위 단계에서 LLM 호출 대신 사용)"""
+    t = user_text or ""
+    scores = {emo: sum(t.count(k) for k in kws) for emo, kws in EMOTION_KEYWORDS.items()}
+    total = sum(scores.values())
+    if not total:
+        return {"희": 100}, "희"
+    percent = {emo: round(v * 100 / total) for emo, v in scores.items() if v}
+    return percent, max(scores, key=scores.get)
+
+async def _analyze_emotion(client: AsyncOpenAI, user_text: str, model: str = "gpt-4o") -> Tuple[Dict[str, Any], str]:
+    """칠정 감정 분석 → (percent, top_emotion). model == "local" 이면 키워드 추정"""
+    if model == "local":
+        return _local_emotion(user_text)
+    emotion_resp = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": '다음 문장에서 불교의 칠정(희,노,애,낙,애(사랑),오,욕)에 대해 '
+                           'JSON 형식({"percent": {...}, "top_emotion": "감정"})으로 분석해줘.'
+            },
+            {"role": "user", "content": user_text}
+        ],
+        temperature=0.0,
+        max_tokens=200,
+        response_format={"type": "json_object"}
+    )
+    emotion_data = json.loads(emotion_resp.choices[0].message.content)
+    return emotion_data.get("percent", {}), emotion_data.get("top_emotion", "희")
 
 def upload_log_to_vercel_blob(blob_name: str, data: dict):
     if not VERCEL_TOKEN or not VERCEL_PROJ_ID:
@@ -168,237 +296,318 @@ def upload_log_to_vercel_blob(blob_name: str, data: dict):
     except Exception as e:
         print(f"Vercel Blob 로그 업로드 예외: {e}")
 
-# ======================================================================================
-# 메인 처리(단발 완성 응답) — 기존 API와 호환
-# ======================================================================================
-async def process_chat(req):
-    try:
-        if 'audio' not in req.files:
-            return jsonify(error="오디오 파일이 필요합니다."), 400
-        api_key   = req.headers.get('X-API-KEY')
-        character = req.form.get('character', 'kei')
-        session_id = _session_id_from_request()
-        client   = get_openai_client(api_key)
+def _api_key_id(api_key: str) -> str:
+    """캐시/합치기 키에 넣는 API 키 식별자 (원문 대신 해시)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
 
-        # 1) Whisper STT
-        audio_file = req.files['audio']
+async def _transcribe(client: AsyncOpenAI, audio_bytes: bytes, filename: str = "audio.webm") -> str:
+    """
+    Whisper STT. 같은 (API 키, 오디오)는 TTL 캐시 재사용, 동시 요청은 1회 호출로 합침
+    (키가 다르면 다른 키의 인증/쿼터 실패를 물려받지 않도록 따로 호출)
+    filename: Whisper 는 확장자로 포맷을 판단하므로 실제 파일 형식에 맞춰 전달
+    """
+    key = f"{_api_key_id(client.api_key)}:{audio_digest(audio_bytes)}"
+    cached = _stt_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def run() -> str:
         stt_result = await client.audio.transcriptions.create(
-            file=("audio.webm", audio_file.read()),
+            file=(filename, audio_bytes),
             model="whisper-1",
             response_format="text"
         )
-        user_text = stt_result or ""
+        return stt_result or ""
+
+    user_text, shared = await _stt_flight.do(key, run)
+    if not shared:
+        _stt_cache.put(key, user_text)
+    return user_text
+
+async def _synthesize_tts(client: AsyncOpenAI, character: str, tts_text: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """TTS 호출 후 (base64 오디오, 립싱크 엔벨로프) 반환. 엔벨로프는 디코드 실패/비활성 시 None"""
+    audio_response = await client.audio.speech.create(
+        model="gpt-4o-mini-tts",
+        voice=CHARACTER_VOICE[character],
+        input=tts_text,
+        response_format=TTS_FORMAT
+    )
+    audio = audio_response.content
+    envelope = None
+    if LIPSYNC_ENABLED:
+        # 디코드/RMS 는 CPU 작업 → 업스트림 루프를 막지 않도록 스레드에서
+        envelope = await asyncio.to_thread(lipsync.compute, audio, TTS_FORMAT, LIPSYNC_FPS)
+    return base64.b64encode(audio).decode(), envelope
+
+def metrics() -> Dict[str, Any]:
+    """/scripts/metrics 응답 본문"""
+    with _prewarm_lock:
+        prewarm_stats = dict(_prewarm_stats, slots=len(_prewarm_slots))
+    with _stream_stats_lock:
+        stream_stats = {
+            mode: dict(st,
+                       events_per_reply=round(st["events"] / st["replies"], 2),
+                       wire_bytes_per_reply=round(st["bytes_wire"] / st["replies"], 1))
+            for mode, st in _stream_stats.items() if st["replies"]
+        }
+    return {
+        "dedup": dedup.stats(_chat_flight, _stt_flight, caches=(_stt_cache,)),
+        "prewarm": prewarm_stats,
+        "upstream": _upstream.stats(),
+        "stream": stream_stats,
+        "degrade": _degrade.stats(),
+        "lipsync": lipsync.stats(),
+    }
 
-        # 2) 감정 분석 (JSON)
-        emotion_resp = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": '다음 문장에서 불교의 칠정(희,노,애,낙,애(사랑),오,욕)에 대해 '
-                               'JSON 형식({"percent": {...}, "top_emotion": "감정"})으로 분석해줘.'
-                },
-                {"role": "user", "content": user_text}
-            ],
-            temperature=0.0,
-            max_tokens=200,
-            response_format={"type": "json_object"}
-        )
-        emotion_data    = json.loads(emotion_resp.choices[0].message.content)
-        emotion_percent = emotion_data.get("percent", {})
-        top_emotion     = emotion_data.get("top_emotion", "희")
+# ======================================================================================
+# 메인 처리(단발 완성 응답) — 기존 API와 호환
+# ======================================================================================
+async def _run_chat_turn(client: AsyncOpenAI, audio_bytes: bytes, character: str, session_id: str) -> Dict[str, Any]:
+    """STT → 감정 → 답변 → TTS → 기록/카드/로그 한 턴 실행 (Flask request 비의존)"""
+    with _degrade.turn():
+        return await _run_chat_turn_at(client, audio_bytes, character, session_id, _degrade.current())
+
+async def _run_chat_turn_at(
+    client: AsyncOpenAI, audio_bytes: bytes, character: str, session_id: str, tier: Tier,
+    offline: bool = False, filename: str = "audio.webm"
+) -> Dict[str, Any]:
+    """
+    턴 시작 시 정해진 품질 단계(tier)로 실행
+    offline=True: 공유 대화 기록을 읽지도 쓰지도 않고, 프로액티브 카드(전역 정책 상태·현재 시각·랜덤에 의존)와
+                  로그 업로드도 생략 (배치 재현성)
+    """
+    # 1) Whisper STT (오디오 해시 캐시/합치기)
+    user_text = await _transcribe(client, audio_bytes, filename)
 
-        # 3) 메인 답변 생성
-        system_prompt = CHARACTER_SYSTEM_PROMPTS[character]
-        with history_lock:
-            messages = [{"role": "system", "content": system_prompt}] + conversation_history[-HISTORY_MAX_LEN:]
+    # 2) 감정 분석 (JSON)
+    emotion_percent, top_emotion = await _analyze_emotion(client, user_text, tier.emotion_model)
 
-        needs_web_search = top_emotion in ["노", "애", "오"]
-        ai_text = ""
-        audio_b64 = ""
-        youtube_link = None
+    # 3) 메인 답변 생성
+    if offline:
+        messages = [{"role": "system", "content": CHARACTER_SYSTEM_PROMPTS[character]}]
+    else:
+        messages = _base_messages(session_id, character)
 
-        # =====================[ 웹 검색 분기 ]=====================
-        if needs_web_search:
+    needs_web_search = tier.search_preview and top_emotion in ["노", "애", "오"]
+    ai_text = ""
+    audio_b64 = ""
+    envelope = None
+    youtube_link = None
+
+    # =====================[ 웹 검색 분기 ]=====================
+    if needs_web_search:
+        user_prompt = (
+            f"{user_text}\n"
+            f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 따뜻한 위로의 말과 함께 웹 검색을 사용해 관련된 위로가 되는 유튜브 음악 URL을 찾아 제안해주세요.)\n"
+            "아래와 같은 구조로 2~3문장 이내로 답변하세요:\n"
+            "1. 공감의 한마디\n"
+            "2. 상황에 어울리는 제안(이럴 때는 ~ 어떤가요?)\n"
+            "3. 제안에 대한 간단한 설명"
+        )
+        messages.append({"role": "user", "content": user_prompt})
+
+        search_response = await client.chat.completions.create(
+            model="gpt-4o-mini-search-preview",
+            messages=messages,
+        )
+        result = search_response.choices[0]
+        content = result.message.content
+        annotations = getattr(result.message, 'annotations', None) or []
+
+        ai_text = content
+        link_list: List[str] = []
+        for ann in annotations:
+            if getattr(ann, "type", None) == "url_citation":
+                url = ann.url_citation.url
+                start = ann.url_citation.start_index
+                end = ann.url_citation.end_index
+                link_text = content[start:end]
+                a_tag = f'<a href="{url}" target="_blank">{link_text}</a>'
+                ai_text = ai_text[:start] + a_tag + ai_text[end:]
+                link_list.append(url)
+
+        ai_text = markdown_to_html_links(ai_text)
+        # (옵션) 링크 과다시 제한
+        # ai_text = _limit_links(ai_text)
+
+        if link_list:
+            youtube_link = link_list[0]
+        else:
+            youtube_link = extract_first_markdown_url(content)
+            if not youtube_link:
+                candidates = EMOTION_LINKS.get(top_emotion, [])
+                if candidates:
+                    _, youtube_link = random.choice(candidates)
+                else:
+                    youtube_link = None
+        if youtube_link and youtube_link not in ai_text:
+            ai_text += f'<br><a href="{youtube_link}" target="_blank">▶️ 추천 음악 바로 듣기</a>'
+
+        # TTS 텍스트(링크 제거/이모지 제거)
+        tts_text = remove_empty_parentheses(content)
+        tts_text = remove_emojis(tts_text)
+        offset = 0
+        for ann in annotations:
+            if getattr(ann, "type", None) == "url_citation":
+                start = ann.url_citation.start_index - offset
+                end = ann.url_citation.end_index - offset
+                tts_text = tts_text[:start] + tts_text[end:]
+                offset += (end - start)
+        tts_text = tts_text.strip()
+
+        audio_b64, envelope = await _synthesize_tts(client, character, tts_text)
+
+    # =====================[ 일반 분기 ]=====================
+    else:
+        if top_emotion in ["희", "낙", "애(사랑)"]:
+            user_prompt = (
+                f"{user_text}\n"
+                f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 어떤 상황인지 구체적으로 질문하며 공감해주세요.)\n"
+            )
+        elif top_emotion == "욕":
+            user_prompt = (
+                f"{user_text}\n"
+                f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 응원의 메시지를 보내주세요.)\n"
+            )
+        else:
             user_prompt = (
                 f"{user_text}\n"
-                f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 따뜻한 위로의 말과 함께 웹 검색을 사용해 관련된 위로가 되는 유튜브 음악 URL을 찾아 제안해주세요.)\n"
                 "아래와 같은 구조로 2~3문장 이내로 답변하세요:\n"
                 "1. 공감의 한마디\n"
                 "2. 상황에 어울리는 제안(이럴 때는 ~ 어떤가요?)\n"
                 "3. 제안에 대한 간단한 설명"
             )
-            messages.append({"role": "user", "content": user_prompt})
+        messages.append({"role": "user", "content": user_prompt})
 
-            search_response = await client.chat.completions.create(
-                model="gpt-4o-mini-search-preview",
-                messages=messages,
-            )
-            result = search_response.choices[0]
-            content = result.message.content
-            annotations = getattr(result.message, 'annotations', None) or []
-
-            ai_text = content
-            link_list: List[str] = []
-            for ann in annotations:
-                if getattr(ann, "type", None) == "url_citation":
-                    url = ann.url_citation.url
-                    start = ann.url_citation.start_index
-                    end = ann.url_citation.end_index
-                    link_text = content[start:end]
-                    a_tag = f'<a href="{url}" target="_blank">{link_text}</a>'
-                    ai_text = ai_text[:start] + a_tag + ai_text[end:]
-                    link_list.append(url)
-
-            ai_text = markdown_to_html_links(ai_text)
-            # (옵션) 링크 과다시 제한
-            # ai_text = _limit_links(ai_text)
-
-            if link_list:
-                youtube_link = link_list[0]
-            else:
-                youtube_link = extract_first_markdown_url(content)
-                if not youtube_link:
-                    candidates = EMOTION_LINKS.get(top_emotion, [])
-                    if candidates:
-                        _, youtube_link = random.choice(candidates)
-                    else:
-                        youtube_link = None
-            if youtube_link and youtube_link not in ai_text:
-                ai_text += f'<br><a href="{youtube_link}" target="_blank">▶️ 추천 음악 바로 듣기</a>'
-
-            # TTS 텍스트(링크 제거/이모지 제거)
-            tts_text = remove_empty_parentheses(content)
-            tts_text = remove_emojis(tts_text)
-            offset = 0
-            for ann in annotations:
-                if getattr(ann, "type", None) == "url_citation":
-                    start = ann.url_citation.start_index - offset
-                    end = ann.url_citation.end_index - offset
-                    tts_text = tts_text[:start] + tts_text[end:]
-                    offset += (end - start)
-            tts_text = tts_text.strip()
-
-            audio_response = await client.audio.speech.create(
-                model="gpt-4o-mini-tts",
-                voice=CHARACTER_VOICE[character],
-                input=tts_text
-            )
-            audio_b64 = base64.b64encode(audio_response.content).decode()
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=512,
+        )
+        ai_text = response.choices[0].message.content or ""
+        ai_text = remove_emojis(ai_text)
+        if not ai_text:
+            ai_text = "아직 답변을 준비하지 못했어요. 다시 한 번 말씀해주시겠어요?"
 
-        # =====================[ 일반 분기 ]=====================
-        else:
-            if top_emotion in ["희", "낙", "애(사랑)"]:
-                user_prompt = (
-                    f"{user_text}\n"
-                    f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 어떤 상황인지 구체적으로 질문하며 공감해주세요.)\n"
-                )
-            elif top_emotion == "욕":
-                user_prompt = (
-                    f"{user_text}\n"
-                    f"(사용자가 '{top_emotion}' 감정을 느끼고 있습니다. 응원의 메시지를 보내주세요.)\n"
-                )
-            else:
-                user_prompt = (
-                    f"{user_text}\n"
-                    "아래와 같은 구조로 2~3문장 이내로 답변하세요:\n"
-                    "1. 공감의 한마디\n"
-                    "2. 상황에 어울리는 제안(이럴 때는 ~ 어떤가요?)\n"
-                    "3. 제안에 대한 간단한 설명"
-                )
-            messages.append({"role": "user", "content": user_prompt})
-
-            response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=512,
-            )
-            ai_text = response.choices[0].message.content or ""
-            ai_text = remove_emojis(ai_text)
-            if not ai_text:
-                ai_text = "아직 답변을 준비하지 못했어요. 다시 한 번 말씀해주시겠어요?"
-
-            # (옵션) 링크 후처리
-            # ai_text = markdown_to_html_links(ai_text)
-            # ai_text = _limit_links(ai_text)
-
-            tts_text = re.sub(r'링크:.*', '', ai_text).strip()
-            tts_text = remove_emojis(tts_text)
-
-            audio_response = await client.audio.speech.create(
-                model="gpt-4o-mini-tts",
-                voice=CHARACTER_VOICE[character],
-                input=tts_text
-            )
-            audio_b64 = base64.b64encode(audio_response.content).decode()
-            youtube_link = None
+        # (옵션) 링크 후처리
+        # ai_text = markdown_to_html_links(ai_text)
+        # ai_text = _limit_links(ai_text)
+
+        tts_text = re.sub(r'링크:.*', '', ai_text).strip()
+        tts_text = remove_emojis(tts_text)
+
+        audio_b64, envelope = await _synthesize_tts(client, character, tts_text)
+        youtube_link = None
 
-        # 4) 대화 기록 갱신
-        now_kst_iso = datetime.datetime.now(datetime.timezone.utc).isoformat() + "Z"
+    # 4) 대화 기록 갱신
+    now_kst_iso = datetime.datetime.now(datetime.timezone.utc).isoformat() + "Z"
+    global _history_version
+    if not offline:
         with history_lock:
+            _history_version += 1
             conversation_history.append({"role": "user", "content": user_text, "ts": now_kst_iso})
             conversation_history.append({"role": "assistant", "content": ai_text, "ts": now_kst_iso})
             if len(conversation_history) > HISTORY_MAX_LEN:
                 conversation_history[:] = conversation_history[-HISTORY_MAX_LEN:]
 
-        # ---------------- 프로액티브 판단/카드 생성 ----------------
-        last_ts = _last_user_utter_ts.get(session_id, 0.0)
-        now_ts  = time.time()
-        silence_sec = now_ts - last_ts if last_ts > 0 else 0.0
-        _last_user_utter_ts[session_id] = now_ts
-
-        topic_hint = _topic_hint_from_text(user_text)
-        suggest_res = _policy.should_suggest(
-            sid=session_id,
-            emotion=top_emotion,
-            last_utter_silence_sec=silence_sec,
-            topic=topic_hint
-        )
-
-        proactive_card: Optional[Dict[str, Any]] = None
-        if suggest_res.get("ok"):
-            s_types = _policy.choose_suggestion_types(session_id)
-            reason  = f"감정={top_emotion}, 침묵={int(silence_sec)}s, topic={topic_hint or '-'}"
-            proactive_card = _build_suggestion_card(s_types, top_emotion, reason)
-            _policy.stamp_suggested(session_id, reason)
-
-        # 로그 업로드 (비동기)
-        log_data = {
-            "timestamp": now_kst_iso,
-            "session_id": session_id,
-            "character": character,
-            "user_text": user_text,
-            "emotion_percent": emotion_percent,
-            "top_emotion": top_emotion,
-            "ai_text": ai_text,
-            "proactive_card": proactive_card or None
-        }
+    # ---------------- 프로액티브 판단/카드 생성 (부하 단계 / 오프라인 실행이면 생략) ----------------
+    if tier.proactive and not offline:
+        proactive_card = _decide_proactive_card(session_id, user_text, top_emotion)
+    else:
+        proactive_card = None
+
+    # 로그 업로드 (비동기)
+    log_data = {
+        "timestamp": now_kst_iso,
+        "session_id": session_id,
+        "character": character,
+        "user_text": user_text,
+        "emotion_percent": emotion_percent,
+        "top_emotion": top_emotion,
+        "ai_text": ai_text,
+        "proactive_card": proactive_card or None
+    }
+    if not offline:
         now = datetime.datetime.now(datetime.timezone.utc)
         blob_name = f"logs/{now.strftime('%Y-%m-%dT%H-%M-%SZ')}_{character}.json"
         asyncio.create_task(asyncio.to_thread(upload_log_to_vercel_blob, blob_name, log_data))
 
-        # 응답
-        return jsonify({
-            "user_text": user_text,
-            "ai_text": remove_empty_parentheses(ai_text),
-            "audio": audio_b64,
-            "emotion_percent": emotion_percent,
-            "top_emotion": top_emotion,
-            "link": youtube_link,
-            "proactive_card": proactive_card
-        })
+    # 응답
+    return {
+        "user_text": user_text,
+        "ai_text": remove_empty_parentheses(ai_text),
+        "audio": audio_b64,
+        "audio_format": TTS_FORMAT,
+        "lipsync": envelope,
+        "emotion_percent": emotion_percent,
+        "top_emotion": top_emotion,
+        "link": youtube_link,
+        "proactive_card": proactive_card
+    }
+
+async def run_offline_turn(
+    api_key: str, audio_bytes: bytes, character: str, session_id: str, tier_name: str = "full",
+    filename: str = "audio.webm"
+) -> Dict[str, Any]:
+    """
+    배치/CLI 용 한 턴: 고정 품질 단계, 대화 기록·프로액티브 정책 등 공유 상태를 읽거나 쓰지 않음
+    (카드는 항상 None). 업스트림 루프에서 실행
+    """
+    tier = next((t for t in _degrade.tiers if t.name == tier_name), None)
+    if tier is None:
+        raise ValueError(f"알 수 없는 품질 단계: {tier_name}")
+    client = _upstream.client_for(api_key)
+    return await _upstream.run(
+        _run_chat_turn_at(client, audio_bytes, character, session_id, tier, offline=True, filename=filename)
+    )
+
+def set_upstream_rate_limit(per_minute: float, burst: int = 1):
+    """배치/CLI 용: 분당 업스트림 HTTP 요청 수 제한 (0 이하면 해제)"""
+    _upstream.limiter = RateLimiter(per_minute, burst) if per_minute > 0 else None
+
+async def process_chat(req):
+    try:
+        if 'audio' not in req.files:
+            return jsonify(error="오디오 파일이 필요합니다."), 400
+        api_key   = req.headers.get('X-API-KEY')
+        character = req.form.get('character', 'kei')
+        if character not in CHARACTER_SYSTEM_PROMPTS:
+            return jsonify(error=f"알 수 없는 캐릭터: {character}"), 400
+        session_id = _session_id_from_request()
+        client   = get_openai_client(api_key)
+        audio_bytes = req.files['audio'].read()
+
+        # 더블클릭/타임아웃 재시도로 같은 오디오가 동시에 들어오면 파이프라인 1회 실행 결과를 공유
+        flight_key = ":".join([
+            audio_digest(audio_bytes), character, session_id,
+            _api_key_id(api_key)
+        ])
+        payload, _ = await _chat_flight.do(
+            flight_key, lambda: _upstream.run(_run_chat_turn(client, audio_bytes, character, session_id))
+        )
+        return jsonify(payload)
 
     except Exception as e:
         import traceback; traceback.print_exc()
         return jsonify({"error": f"Failed to process request: {e}"}), 500
 
+def _delta_text(chunk) -> Optional[str]:
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+def _record_stream_stats(mode: str, stats: Dict[str, int]):
+    with _stream_stats_lock:
+        st = _stream_stats.setdefault(mode, {"replies": 0, "events": 0, "bytes_raw": 0, "bytes_wire": 0})
+        st["replies"] += 1
+        for key in ("events", "bytes_raw", "bytes_wire"):
+            st[key] += stats.get(key, 0)
+
 # ======================================================================================
 # 스트리밍 처리(SSE 스타일) — /scripts/chat_stream 에서 사용
 # ======================================================================================
 async def stream_chat(req):
     """
-    토큰 단위로 전송 후, 마지막에 최종 패킷(ai_text/html, audio_b64, emotion, proactive_card) 송신
+    토큰(compact 모드는 묶음 텍스트) 전송 → meta(텍스트/카드) → final(오디오 포함) 순으로 송신
     Front: fetch('/scripts/chat_stream', ...) + ReadableStream 파싱(chat.js 참고)
     """
     if 'audio' not in req.files:
@@ -406,93 +615,121 @@ async def stream_chat(req):
 
     api_key   = req.headers.get('X-API-KEY')
     character = req.form.get('character', 'kei')
+    if character not in CHARACTER_SYSTEM_PROMPTS:
+        return jsonify(error=f"알 수 없는 캐릭터: {character}"), 400
     session_id = _session_id_from_request()
     client    = get_openai_client(api_key)
 
-    # 1) STT
-    audio_file = req.files['audio']
-    stt_result = await client.audio.transcriptions.create(
-        file=("audio.webm", audio_file.read()),
-        model="whisper-1",
-        response_format="text"
-    )
-    user_text = stt_result or ""
+    # 프레이밍/압축 협상
+    framing = req.form.get('framing') or req.headers.get('X-SSE-FRAMING') or SSE_FRAMING
+    if framing not in sse.FRAMING_MODES:
+        framing = SSE_FRAMING
+    encoding = sse.negotiate_encoding(req.headers.get('Accept-Encoding', ''), SSE_COMPRESSION)
 
-    # 2) 감정 분석
-    emotion_resp = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system",
-             "content": '다음 문장에서 불교의 칠정(희,노,애,낙,애(사랑),오,욕)에 대해 '
-                        'JSON 형식({"percent": {...}, "top_emotion": "감정"})으로 분석해줘.'},
-            {"role": "user", "content": user_text}
-        ],
-        temperature=0.0,
-        max_tokens=200,
-        response_format={"type": "json_object"}
-    )
-    emotion_data    = json.loads(emotion_resp.choices[0].message.content)
-    emotion_percent = emotion_data.get("percent", {})
-    top_emotion     = emotion_data.get("top_emotion", "희")
-
-    # 3) 스트리밍용 메시지 구성
-    system_prompt = CHARACTER_SYSTEM_PROMPTS[character]
-    with history_lock:
-        messages = [{"role": "system", "content": system_prompt}] + conversation_history[-HISTORY_MAX_LEN:]
-        messages.append({"role": "user", "content": user_text})
+    # 진행 중 턴: 응답 스트림이 닫힐 때까지 집계
+    _degrade.turn_started()
+    handed_off = False  # Response.call_on_close 로 넘긴 뒤에는 응답 종료 시 해제
+    try:
+        tier = _degrade.current()
 
-    needs_web_search = top_emotion in ["노", "애", "오"]
-    if needs_web_search:
-        messages[-1] = {"role": "user", "content":
-            f"{user_text}\n(따뜻한 위로 + 관련 유튜브 음악 URL 제안)\n2~3문장으로 요약 답변"}
-        model_name = "gpt-4o-mini-search-preview"
-    else:
-        model_name = "gpt-4o"
+        # 1) STT (오디오 해시 캐시/합치기) — 업스트림 호출은 모두 업스트림 루프에서
+        user_text = await _upstream.run(_transcribe(client, req.files['audio'].read()))
 
-    async def event_stream():
-        # LLM 스트림
-        stream = await client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=512,
-            stream=True
+        # 2) 감정 분석
+        emotion_percent, top_emotion = await _upstream.run(
+            _analyze_emotion(client, user_text, tier.emotion_model)
         )
-        full_text: List[str] = []
 
-        async for chunk in stream:
-            delta = chunk.choices[0].delta.get("content")
-            if delta:
-                full_text.append(delta)
-                yield f"event: token\ndata: {json.dumps({'token': delta}, ensure_ascii=False)}\n\n"
+        # 3) 스트리밍용 메시지 구성
+        messages = _base_messages(session_id, character)
+        messages.append({"role": "user", "content": user_text})
 
-        final_text = "".join(full_text).strip() or "아직 답변을 준비하지 못했어요. 다시 말씀해주시겠어요?"
-        final_text_noemoji = remove_emojis(final_text)
+        needs_web_search = tier.search_preview and top_emotion in ["노", "애", "오"]
+        if needs_web_search:
+            messages[-1] = {"role": "user", "content":
+                f"{user_text}\n(따뜻한 위로 + 관련 유튜브 음악 URL 제안)\n2~3문장으로 요약 답변"}
+            model_name = "gpt-4o-mini-search-preview"
+        else:
+            model_name = "gpt-4o"
+
+        async def event_stream():
+            # LLM 스트림
+            stream = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=512,
+                stream=True
+            )
+            full_text: List[str] = []
+
+            if framing == "token":
+                # 기존: 델타마다 JSON 이벤트 1개
+                async for chunk in stream:
+                    delta = _delta_text(chunk)
+                    if delta:
+                        full_text.append(delta)
+                        yield sse.json_event("token", {"token": delta})
+            else:
+                # compact: 델타를 모아 SSE_FLUSH_MS 경과 또는 SSE_FLUSH_BYTES 도달 시 원문 텍스트로 전송
+                coalescer = sse.FrameCoalescer(SSE_FLUSH_MS, SSE_FLUSH_BYTES)
+                chunks = stream.__aiter__()
+                next_chunk = asyncio.ensure_future(chunks.__anext__())
+                try:
+                    while True:
+                        done, _ = await asyncio.wait({next_chunk}, timeout=coalescer.remaining())
+                        if not done:  # 다음 델타가 늦으면 모인 것부터 보냄
+                            text = coalescer.flush()
+                            if text:
+                                yield sse.text_event("t", text)
+                            continue
+                        try:
+                            chunk = next_chunk.result()
+                        except StopAsyncIteration:
+                            break
+                        next_chunk = asyncio.ensure_future(chunks.__anext__())
+                        delta = _delta_text(chunk)
+                        if delta:
+                            full_text.append(delta)
+                            text = coalescer.add(delta)
+                            if text:
+                                yield sse.text_event("t", text)
+                finally:
+                    next_chunk.cancel()
+                text = coalescer.flush()
+                if text:
+                    yield sse.text_event("t", text)
+
+            final_text = "".join(full_text).strip() or "아직 답변을 준비하지 못했어요. 다시 말씀해주시겠어요?"
+            final_text_noemoji = remove_emojis(final_text)
+
+            # --- 후처리 단계: 최종 텍스트가 나오는 즉시 TTS 시작, 링크/카드는 그 사이 병행 ---
+            tts_text = re.sub(r'링크:.*', '', final_text_noemoji).strip()
+            tts_task = asyncio.create_task(_synthesize_tts(client, character, tts_text))
+            card_task = asyncio.create_task(
+                asyncio.to_thread(_decide_proactive_card, session_id, user_text, top_emotion)
+            ) if tier.proactive else None
 
-        # --- 후처리 동시 실행: 링크/카드/로그/TTS ---
-        async def build_final_payload():
             # 링크 HTML화
             ai_text_html = markdown_to_html_links(final_text_noemoji)
             # ai_text_html = _limit_links(ai_text_html)  # (옵션)
 
             # 프로액티브 카드
-            proactive_card = None
             try:
-                topic_hint = _topic_hint_from_text(user_text)
-                last_ts = _last_user_utter_ts.get(session_id, 0.0)
-                now_ts  = time.time()
-                silence_sec = now_ts - last_ts if last_ts > 0 else 0.0
-                _last_user_utter_ts[session_id] = now_ts
-
-                suggest_res = _policy.should_suggest(session_id, top_emotion, silence_sec, topic_hint)
-                if suggest_res.get("ok"):
-                    s_types = _policy.choose_suggestion_types(session_id)
-                    reason  = f"감정={top_emotion}, 침묵={int(silence_sec)}s, topic={topic_hint or '-'}"
-                    proactive_card = _build_suggestion_card(s_types, top_emotion, reason)
-                    _policy.stamp_suggested(session_id, reason)
+                proactive_card = await card_task if card_task else None
             except Exception:
                 proactive_card = None
 
+            # 텍스트/카드는 오디오를 기다리지 않고 먼저 전송
+            meta = {
+                "user_text": user_text,
+                "ai_text": ai_text_html,
+                "emotion_percent": emotion_percent,
+                "top_emotion": top_emotion,
+                "proactive_card": proactive_card
+            }
+            yield sse.json_event("meta", meta)
+
             # 로그 업로드
             now_kst_iso = datetime.datetime.now(datetime.timezone.utc).isoformat() + "Z"
             log_data = {
@@ -510,30 +747,64 @@ async def stream_chat(req):
             asyncio.create_task(asyncio.to_thread(upload_log_to_vercel_blob, blob_name, log_data))
 
             # TTS
-            audio_b64 = ""
             try:
-                tts_text = re.sub(r'링크:.*', '', final_text_noemoji).strip()
-                audio_response = await client.audio.speech.create(
-                    model="gpt-4o-mini-tts",
-                    voice=CHARACTER_VOICE[character],
-                    input=tts_text
-                )
-                audio_b64 = base64.b64encode(audio_response.content).decode()
+                audio_b64, envelope = await tts_task
             except Exception:
-                pass
+                audio_b64, envelope = "", None
 
-            return {
-                "ai_text": ai_text_html,
-                "audio": audio_b64,
-                "emotion_percent": emotion_percent,
-                "top_emotion": top_emotion,
-                "proactive_card": proactive_card
-            }
+            payload = dict(meta, audio=audio_b64, audio_format=TTS_FORMAT, lipsync=envelope)
+            yield sse.json_event("final", payload)
 
-        payload = await build_final_payload()
-        yield f"event: final\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        def body():
+            stats: Dict[str, int] = {}
+            try:
+                yield from sse.encode_stream(_upstream.iter_sync(event_stream()), sse.StreamEncoder(encoding), stats)
+            finally:
+                _record_stream_stats(f"{framing}/{encoding or 'identity'}", stats)
+
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        # 요청 값은 위에서 모두 꺼냈으므로 request 컨텍스트 없이 스트리밍
+        # (stream_with_context 는 async 뷰와 컨텍스트가 달라 pop 시 실패)
+        resp = Response(body(), mimetype="text/event-stream", headers=headers)
+        # 본문을 한 번도 읽지 않고 끊겨도 응답 종료 시 반드시 진행 중 턴 해제
+        resp.call_on_close(_degrade.turn_finished)
+        handed_off = True
+        return resp
+    finally:
+        if not handed_off:
+            _degrade.turn_finished()
+
+# ======================================================================================
+# 녹음 시작 프리웜 — /scripts/prewarm
+# ======================================================================================
+def prewarm():
+    """
+    녹음 시작 시점에 호출: 업스트림 연결/클라이언트를 데우고
+    대화 기록 스냅샷·프로액티브 상태를 세션 슬롯에 미리 준비 → 이어지는 /scripts/chat(_stream)은 바로 STT부터
+    """
+    api_key   = request.headers.get('X-API-KEY')
+    character = request.form.get('character', 'kei')
+    if not api_key:
+        return jsonify(ok=False, error="OpenAI API 키가 필요합니다."), 401
+    if character not in CHARACTER_SYSTEM_PROMPTS:
+        return jsonify(ok=False, error=f"알 수 없는 캐릭터: {character}"), 400
+    session_id = _session_id_from_request()
 
-    return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
+    warmed = _upstream.prewarm(api_key)
+    history_version, messages = _snapshot_messages(character)
+    with _policy_lock:
+        _policy.state_of(session_id)
+    with _prewarm_lock:
+        _prewarm_stats["requests"] += 1
+        _prewarm_slots[session_id] = PrewarmSlot(
+            expires_at=time.time() + PREWARM_SLOT_TTL_SEC,
+            character=character,
+            history_version=history_version,
+            messages=messages
+        )
+    return jsonify({"ok": True, "warmed": warmed, "slot_ttl_sec": PREWARM_SLOT_TTL_SEC})
 
 # ======================================================================================
 # 프로액티브 피드백 수집 — /proactive/feedback
@@ -549,9 +820,23 @@ def proactive_feedback():
         accepted = bool(data.get("accepted", False))
 
         stype: SuggestionType = suggestion_type if suggestion_type in ["music","breathing","timer","memo","info"] else "info"
-        _policy.feedback(session_id, stype, accepted)
-        st = _policy.state_of(session_id)
-        return jsonify({"ok": True, "weights": st.pref_weights, "accepts": st.accepts, "rejects": st.rejects})
+        with _policy_lock:
+            _policy.feedback(session_id, stype, accepted)
+            st = _policy.state_of(session_id)
+            weights, accepts, rejects = dict(st.pref_weights), st.accepts, st.rejects
+
+        # 피드백도 로그로 남김 → logstore 컴팩션 시 직전 카드와 결합(card_type별 수용률)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        log_data = {
+            "timestamp": now.isoformat(),
+            "event": "proactive_feedback",
+            "session_id": session_id,
+            "suggestion_type": stype,
+            "accepted": accepted
+        }
+        blob_name = f"logs/{now.strftime('%Y-%m-%dT%H-%M-%SZ')}_feedback.json"
+        threading.Thread(target=upload_log_to_vercel_blob, args=(blob_name, log_data), daemon=True).start()
+        return jsonify({"ok": True, "weights": weights, "accepts": accepts, "rejects": rejects})
     except Exception as e:
         import traceback; traceback.print_exc()
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -0,0 +1,114 @@
+# scripts/sse.py
+"""
+/scripts/chat_stream SSE 프레이밍
+
+- token  : 기존 방식. 델타마다 `event: token` + JSON 1개
+- compact: 델타를 모아 N ms 또는 M 바이트마다 `event: t` 로 한 번에 전송, 본문은 JSON 없이 원문 텍스트
+           (줄바꿈은 data: 줄을 나눠서 표현, 각 줄의 첫 공백 1개는 SSE 규칙대로 구분자)
+- 압축   : Accept-Encoding 에 따라 gzip/br 스트림 압축, 프레임마다 sync flush 로 즉시 전달
+"""
+import json
+import time
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+try:  # 선택 의존성
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+FRAMING_MODES = ("token", "compact")
+
+def json_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def text_event(event: str, text: str) -> str:
+    """JSON 없이 원문 텍스트 전송 (여러 줄이면 data: 줄 여러 개)"""
+    lines = text.replace("\r", "").split("\n")
+    return f"event: {event}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+class FrameCoalescer:
+    """델타를 모아 flush_ms 경과 또는 flush_bytes 도달 시 한 덩어리로 내보냄"""
+    def __init__(self, flush_ms: float, flush_bytes: int):
+        self.flush_sec = flush_ms / 1000.0
+        self.flush_bytes = flush_bytes
+        self._parts = []
+        self._size = 0
+        self._since: Optional[float] = None
+
+    def add(self, delta: str) -> Optional[str]:
+        if self._since is None:
+            self._since = time.monotonic()
+        self._parts.append(delta)
+        self._size += len(delta.encode("utf-8"))
+        if self._size >= self.flush_bytes or self.remaining() <= 0:
+            return self.flush()
+        return None
+
+    def remaining(self) -> Optional[float]:
+        """다음 시간 기준 flush 까지 남은 초 (버퍼가 비어 있으면 None)"""
+        if self._since is None:
+            return None
+        return self.flush_sec - (time.monotonic() - self._since)
+
+    def flush(self) -> Optional[str]:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts, self._size, self._since = [], 0, None
+        return text
+
+def negotiate_encoding(accept_encoding: str, setting: str) -> Optional[str]:
+    """setting: off | auto | gzip | br → 실제 Content-Encoding (없으면 None)"""
+    if setting == "off":
+        return None
+    accepted = {p.split(";")[0].strip().lower() for p in (accept_encoding or "").split(",")}
+    prefs = ["br", "gzip"] if setting == "auto" else [setting]
+    for enc in prefs:
+        if enc == "br" and brotli is None:
+            continue
+        if enc in accepted:
+            return enc
+    return None
+
+class StreamEncoder:
+    """프레임 단위 압축기: 프레임마다 flush 해서 클라이언트가 바로 풀 수 있게 한다"""
+    def __init__(self, encoding: Optional[str]):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._z = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._br = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+
+    def encode(self, frame: str) -> bytes:
+        data = frame.encode("utf-8")
+        if self.encoding == "gzip":
+            return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return data
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._z.flush(zlib.Z_FINISH)
+        if self.encoding == "br":
+            return self._br.finish()
+        return b""
+
+def encode_stream(frames: Iterable[str], encoder: StreamEncoder, stats: Optional[dict] = None) -> Iterator[bytes]:
+    """str 프레임 → (압축) bytes. stats 에 events/bytes_raw/bytes_wire 누적"""
+    if stats is None:
+        stats = {}
+    for key in ("events", "bytes_raw", "bytes_wire"):
+        stats.setdefault(key, 0)
+    for frame in frames:
+        out = encoder.encode(frame)
+        stats["events"] += 1
+        stats["bytes_raw"] += len(frame.encode("utf-8"))
+        stats["bytes_wire"] += len(out)
+        if out:
+            yield out
+    tail = encoder.finish()
+    stats["bytes_wire"] += len(tail)
+    if tail:
+        yield tail
@@ -0,0 +1,248 @@
+# scripts/upstream.py
+"""
+업스트림(OpenAI) 연결 풀
+
+Flask async 뷰는 요청마다 새 이벤트 루프에서 실행되고 끝나면 루프가 닫히므로
+httpx 연결(keep-alive)이 요청 간에 재사용되지 않는다.
+→ 백그라운드 스레드의 단일 이벤트 루프에 API 키별 AsyncOpenAI 클라이언트를 고정하고,
+  업스트림 호출이 들어간 코루틴은 모두 이 루프에서 실행한다.
+배치 실행 시에는 limiter 로 분당 업스트림 요청 수를 제한할 수 있다.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# (응답 헤더까지 걸린 초, HTTP 상태 코드, 엔드포인트 — 예: "chat/completions:stream", "audio/speech")
+UpstreamObserver = Callable[[float, int, str], None]
+
+def _endpoint_of(request: httpx.Request, response: httpx.Response) -> str:
+    """/v1/ 뒤 경로 + 스트리밍(SSE) 응답이면 ":stream" """
+    path = request.url.path
+    endpoint = path.split("/v1/", 1)[-1].strip("/")
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        endpoint += ":stream"
+    return endpoint
+
+class RateLimiter:
+    """분당 요청 수 토큰 버킷 (업스트림 루프에서만 사용하므로 락 불필요)"""
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.waited_sec = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = (1 - self._tokens) / self.rate
+            self.waited_sec += wait
+            await asyncio.sleep(wait)
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """응답 본문이 닫힐 때 done 호출 (스트리밍 응답도 끝까지 진행 중으로 집계)"""
+    def __init__(self, inner: httpx.AsyncByteStream, done: Callable[[], None]):
+        self._inner = inner
+        self._done: Optional[Callable[[], None]] = done
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._inner.aclose()
+        finally:
+            if self._done is not None:
+                self._done, done = None, self._done
+                done()
+
+class _ObservedTransport(httpx.AsyncBaseTransport):
+    """
+    모든 업스트림 HTTP 호출(SDK 재시도 포함)을 gate 로 제한하고 지연/상태를 observer 에 보고.
+    진행 중 요청 수/마지막 활동 시각도 기록 (LRU 에서 밀려난 클라이언트를 유휴 상태일 때만 닫기 위해)
+    """
+    def __init__(
+        self,
+        inner: httpx.AsyncBaseTransport,
+        observer: Optional[UpstreamObserver],
+        gate: Callable[[], Awaitable[None]]
+    ):
+        self._inner = inner
+        self._observer = observer
+        self._gate = gate
+        self.in_flight = 0          # 업스트림 루프에서만 변경
+        self.last_active = time.monotonic()
+
+    def _finished(self):
+        self.in_flight -= 1
+        self.last_active = time.monotonic()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self._gate()
+        self.in_flight += 1
+        self.last_active = time.monotonic()
+        t0 = time.perf_counter()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            self._finished()
+            raise
+        if response.is_closed:  # 본문을 이미 다 읽은 응답
+            self._finished()
+        else:
+            response.stream = _TrackedStream(response.stream, self._finished)
+        if self._observer is not None:
+            try:
+                self._observer(time.perf_counter() - t0, response.status_code, _endpoint_of(request, response))
+            except Exception as e:
+                print(f"업스트림 관측 실패: {e}")
+        return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+class UpstreamPool:
+    def __init__(self, max_clients: int, keepalive_sec: float, observer: Optional[UpstreamObserver] = None):
+        self.max_clients = max_clients
+        self.keepalive_sec = keepalive_sec
+        self.observer = observer
+        self.limiter: Optional[RateLimiter] = None  # 배치 CLI 등에서 설정
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: "OrderedDict[str, Tuple[AsyncOpenAI, _ObservedTransport]]" = OrderedDict()
+        # LRU 에서 밀려났지만 아직 닫지 않은 클라이언트 (요청 중이거나 최근에 쓰였을 수 있음)
+        self._retired: Dict[str, Tuple[AsyncOpenAI, _ObservedTransport]] = {}
+        self._last_warm: Dict[str, float] = {}
+
+    # ---------------- 루프/클라이언트 ----------------
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="upstream-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def client_for(self, api_key: str) -> AsyncOpenAI:
+        """API 키별 클라이언트 (LRU, keep-alive 연장)"""
+        kid = self._key_id(api_key)
+        evicted = []
+        with self._lock:
+            entry = self._clients.get(kid) or self._retired.pop(kid, None)  # 닫히기 전이면 되살림
+            if entry is None:
+                transport = _ObservedTransport(
+                    httpx.AsyncHTTPTransport(
+                        limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=self.keepalive_sec)
+                    ),
+                    self.observer, self._gate
+                )
+                client = AsyncOpenAI(api_key=api_key, http_client=DefaultAsyncHttpxClient(transport=transport))
+                entry = (client, transport)
+            self._clients[kid] = entry
+            self._clients.move_to_end(kid)
+            while len(self._clients) > self.max_clients:
+                old_kid, old = self._clients.popitem(last=False)
+                self._last_warm.pop(old_kid, None)
+                self._retired[old_kid] = old
+                evicted.append((old_kid, old))
+        for old_kid, old in evicted:
+            asyncio.run_coroutine_threadsafe(self._close_when_idle(old_kid, old), self.loop())
+        return entry[0]
+
+    async def _close_when_idle(self, kid: str, entry: Tuple[AsyncOpenAI, _ObservedTransport]):
+        """
+        밀려난 클라이언트는 진행 중 요청이 없고 keep-alive 시간만큼 쓰이지 않았을 때 닫는다.
+        (한 턴은 STT → 감정 → 답변 → TTS 로 같은 클라이언트를 이어 쓰므로 요청 사이 공백에 닫지 않도록)
+        """
+        client, transport = entry
+        while True:
+            with self._lock:
+                if self._retired.get(kid) is not entry:
+                    return  # 되살아났거나 이미 처리됨
+                idle = transport.in_flight == 0 and time.monotonic() - transport.last_active >= self.keepalive_sec
+                if idle:
+                    del self._retired[kid]
+            if idle:
+                await client.close()
+                return
+            await asyncio.sleep(1.0)
+
+    async def _gate(self):
+        # keep-alive 연결은 업스트림 루프에 묶여 있음 → 다른 루프(Flask 뷰 루프 등)에서 쓰면
+        # 닫힌 루프의 연결을 재사용해 "Connection error" 로 실패하므로 원인을 분명히 알리고 즉시 중단
+        if asyncio.get_running_loop() is not self._loop:
+            raise RuntimeError("업스트림 클라이언트는 UpstreamPool.run / iter_sync 안에서만 사용할 수 있습니다.")
+        if self.limiter is not None:
+            await self.limiter.acquire()
+
+    # ---------------- 실행 ----------------
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """업스트림 루프에서 코루틴 실행 후 결과를 현재 루프에서 await"""
+        loop = self.loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def iter_sync(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """async generator 를 업스트림 루프에서 돌리며 sync generator 로 노출 (werkzeug 스트리밍용)"""
+        loop = self.loop()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    break
+        finally:
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+    # ---------------- 프리웜 ----------------
+    def prewarm(self, api_key: str) -> bool:
+        """
+        클라이언트 생성 + (keep-alive 창 안에 이미 데운 적 없으면) 가벼운 호출로 TLS 연결을 미리 연다.
+        응답을 기다리지 않는다. 반환: 새로 연결을 데우기 시작했는지
+        """
+        client = self.client_for(api_key)
+        kid = self._key_id(api_key)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_warm.get(kid, 0.0) < self.keepalive_sec * 0.5:
+                return False
+            self._last_warm[kid] = now
+
+        async def warm():
+            try:
+                await client.models.list()
+            except Exception as e:
+                print(f"업스트림 프리웜 실패: {e}")
+                with self._lock:
+                    self._last_warm.pop(kid, None)
+
+        asyncio.run_coroutine_threadsafe(warm(), self.loop())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"clients": len(self._clients), "retired": len(self._retired)}
+        if self.limiter is not None:
+            out["rate_limit_waited_sec"] = round(self.limiter.waited_sec, 3)
+        return out